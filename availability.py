@@ -0,0 +1,62 @@
+import numpy as np
+
+from status_codec import status_array
+
+# Free/occupied slot counts per slot type ("type" in config.json: car, bike,
+# suv...) and per zone (an optional "zone" on each slot), for signage boards
+# and the map view. Counted ONCE from the config; after that every status
+# change only moves the slots that flipped, so serving them never scans the lot.
+
+DEFAULT_ZONE = "default"  # Zone of slots without one
+DEFAULT_TYPE = "car"
+FREE = ord('0')
+
+
+def _entry(total, occupied):
+    return {"total": int(total), "occupied": int(occupied), "free": int(total - occupied)}
+
+
+class Availability:
+    """
+    Counters per (zone, slot type) cell. Each slot belongs to one cell; a slot
+    going free -> occupied adds one to its cell, occupied -> free takes one off.
+    """
+
+    def __init__(self, config, status_string=None):
+        slots = config['slots']
+        self.type_names, slot_types = np.unique(
+            [str(slot.get('type', DEFAULT_TYPE)) for slot in slots] or [DEFAULT_TYPE], return_inverse=True)
+        self.zone_names, slot_zones = np.unique(
+            [str(slot.get('zone', DEFAULT_ZONE)) for slot in slots] or [DEFAULT_ZONE], return_inverse=True)
+        num_cells = len(self.zone_names) * len(self.type_names)
+        self.slot_cells = (slot_zones * len(self.type_names) + slot_types)[:len(slots)]
+        self.totals = np.bincount(self.slot_cells, minlength=num_cells)
+        self.occupied = np.zeros(num_cells, dtype=np.int64)
+        if status_string:
+            # Start from the current status (a reload): the only full count
+            occupied = status_array(status_string) != FREE
+            self.occupied = np.bincount(self.slot_cells[occupied], minlength=num_cells)
+
+    def apply(self, changed, old_codes, new_codes):
+        """Moves the `changed` slot indices from their old codes to their new ones."""
+        was_free = old_codes[changed] == FREE
+        now_free = new_codes[changed] == FREE
+        np.add.at(self.occupied, self.slot_cells[changed[was_free & ~now_free]], 1)
+        np.subtract.at(self.occupied, self.slot_cells[changed[~was_free & now_free]], 1)
+
+    def summary(self):
+        """{"all": {...}, "by_type": {...}, "by_zone": {...}, "by_zone_and_type": {...}} of total/occupied/free."""
+        shape = (len(self.zone_names), len(self.type_names))
+        totals = self.totals.reshape(shape)
+        occupied = self.occupied.reshape(shape)
+        return {
+            "all": _entry(totals.sum(), occupied.sum()),
+            "by_type": {str(name): _entry(totals[:, index].sum(), occupied[:, index].sum())
+                        for index, name in enumerate(self.type_names) if totals[:, index].any()},
+            "by_zone": {str(name): _entry(totals[index].sum(), occupied[index].sum())
+                        for index, name in enumerate(self.zone_names) if totals[index].any()},
+            "by_zone_and_type": {
+                str(zone): {str(slot_type): _entry(totals[z, t], occupied[z, t])
+                            for t, slot_type in enumerate(self.type_names) if totals[z, t]}
+                for z, zone in enumerate(self.zone_names) if totals[z].any()},
+        }
@@ -1,13 +1,365 @@
 import cv2
-import numpy as np
-import requests
-import json
+import httpx
+import os
 import time
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import json
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from threading import Thread
 from fastapi.middleware.cors import CORSMiddleware  # <--- IMPORT THIS
+from pydantic import BaseModel
+from lot_registry import view_map_points
+from lot_setup import load_lots, apply_matching_settings
+from debug_view import render_view, encode_image
+from status_events import StatusNotifier
+from status_codec import FORMATS, encode_bitset, status_token, token_version
+from detection_log import DetectionRecorder
+from loop_profiler import MODES as PROFILE_MODES, make_profiler
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import metrics
+from shared_state import SharedRegistry, write_index
+from slot_finder import nearest_free_slots
+
+# --- CONFIGURATION ---
+# The lots (registry.json or config.json + matrix.npy) and how detections are
+# matched to slots (rasters, footprints, smoothing) are set in lot_setup.py
+LOT_WORKERS = 4        # Lots are processed in parallel on this many threads
+
+# Every edge node (camera) to poll. All of them are fetched at the same time.
+EDGE_URLS = [
+    "http://localhost:5000/detections",
+    # "https://mugwumpian-scottie-homely.ngrok-free.dev/get_coords",
+]
+EDGE_TIMEOUT = 1.0     # Seconds, per edge: a slow camera only loses its own tick
+EDGE_STALE_AFTER = 5.0 # Seconds to keep reusing an edge's last good detections when it fails
+POLL_EDGE = True       # False when the edge nodes push to POST /api/detections instead
+HEADLESS = False       # True on servers with no display: no cv2 window, use /debug/god_mode.mjpg
+DEBUG_STREAM_FPS = 5   # Max frame rate of the MJPEG debug stream
+LONG_POLL_MAX_WAIT = 30.0 # Seconds a long-poll on /api/status may be held open
+SSE_KEEPALIVE = 15.0   # Seconds between keep-alive comments on idle status streams
+
+HISTORY_DIR = "history" # Slot transitions of each lot go to <HISTORY_DIR>/<lot_id>.log (None = off)
+
+CONFIG_WATCH_INTERVAL = 2.0 # Seconds between checks of config.json / matrix.npy for edits (None = off)
+RECORD_FILE = None      # e.g. "recordings/rush_hour.det": save every detection update for replay.py
+
+# Opt-in profiling of the processing loop (see loop_profiler.py). Also
+# switchable at runtime: POST /api/admin/profile?mode=spans
+PROFILE_MODE = None     # "spans" (Chrome trace + folded spans) or "stacks" (sampled call stacks), None = off
+PROFILE_EVERY = 100     # Record one polling tick out of this many (pushed updates during it are included)
+PROFILE_DIR = "profiles"
+# Threads sampled in "stacks" mode: the polling loop, the lot workers and the pushes (FastAPI's workers)
+PROFILE_THREADS = ("processing", "lot", "AnyIO")
+
+# Multi-worker serving (python serve.py) runs this module in two roles, set by
+# serve.py: one "engine" process that does all the matching and publishes the
+# status into shared memory, and "api" worker processes that serve /api/* from
+# it (pushes, admin, history, debug and /metrics are forwarded to the engine).
+# Plain `uvicorn backend_brain:app` = "all": one process, everything in memory.
+ROLE = os.environ.get("PARKING_ROLE", "all")
+SHARED_STATE_DIR = os.environ.get("PARKING_STATE_DIR")
+ENGINE_URL = os.environ.get("PARKING_ENGINE_URL")
+SHARED_POLL_INTERVAL = 0.02 # Seconds between API workers' checks for a new version (wakes long-polls/SSE)
+# ---------------------
+
+if ROLE == "api":
+    # No cameras here: the lots' status comes from the engine's shared state
+    registry = SharedRegistry(SHARED_STATE_DIR)
+    recorder = None
+    print(f"API worker {os.getpid()} serving {len(registry.lots)} lot(s) from {SHARED_STATE_DIR}")
+else:
+    # Load every Lot (config + slot index) and Camera (homography) ONCE,
+    # matched the way lot_setup.py says (replay.py uses the same settings)
+    registry = load_lots(EDGE_URLS)
+    print(f"Serving {len(registry.lots)} lot(s) from {len(registry.cameras)} camera(s)")
+    apply_matching_settings(registry)
+
+    if HISTORY_DIR:
+        for lot in registry.lots.values():
+            lot.enable_history(os.path.join(HISTORY_DIR, f"{lot.lot_id}.log"))
+
+    # Raw detections exactly as the edges sent them, so incidents can be replayed
+    recorder = DetectionRecorder(RECORD_FILE) if RECORD_FILE else None
+    if recorder:
+        print(f"Recording detections to {RECORD_FILE}")
+
+    if ROLE == "engine":
+        for lot in registry.lots.values():
+            lot.enable_shared_state(SHARED_STATE_DIR)
+        # Written last: API workers start serving once this file exists
+        write_index(SHARED_STATE_DIR, registry.lots)
+
+# Swapped by POST /api/admin/profile; DISABLED (no-ops) unless PROFILE_MODE is set
+profiler = make_profiler("backend", PROFILE_MODE, PROFILE_EVERY, PROFILE_DIR, PROFILE_THREADS)
+
+# Lets SSE streams and long-polls sleep until a lot's status actually changes
+status_notifier = StatusNotifier()
+
+# Worker pool so many lots are matched in parallel (NumPy/cv2 release the GIL)
+lot_pool = ThreadPoolExecutor(max_workers=LOT_WORKERS, thread_name_prefix="lot")
+
+def get_lot(lot_id):
+    if lot_id not in registry.lots:
+        raise HTTPException(status_code=404, detail=f"Unknown lot '{lot_id}'")
+    return registry.lots[lot_id]
+
+def observe_camera(camera):
+    """Feeds the camera's latest classify() into /metrics."""
+    metrics.DETECTIONS.labels(camera.camera_id).inc(len(camera.slot_indices))
+    metrics.UNMATCHED_DETECTIONS.labels(camera.camera_id).inc(int((camera.slot_indices < 0).sum()))
+    metrics.TRANSFORM_SECONDS.observe(camera.transform_seconds)
+    metrics.MATCH_SECONDS.observe(camera.match_seconds)
+
+def update_lot(lot, camera_results):
+    """
+    Sets each camera's new detections -> Matches -> Updates the lot's String.
+    camera_results: [(camera, raw_detections), ...]; None = keep that camera's last points.
+    """
+    started = time.perf_counter()
+    now = time.time()
+    with profiler.span("update_lot"):
+        with profiler.span("lock_wait"):
+            lot.lock.acquire()
+        try:
+            if recorder:
+                # Under the lot's lock, so the log has this lot's updates in the order they were applied
+                with profiler.span("record"):
+                    recorder.record(now, [(camera.camera_id, raw_detections)
+                                          for camera, raw_detections in camera_results if raw_detections is not None])
+            for camera, raw_detections in camera_results:
+                if raw_detections is not None:
+                    with profiler.span("set_detections"):
+                        camera.set_detections(raw_detections, now)
+                    observe_camera(camera)
+            with profiler.span("recompute"):
+                changed = lot.recompute()
+            status_string = lot.status_string
+            occupied = lot.counts['occupied']
+        finally:
+            lot.lock.release()
+
+    metrics.OCCUPIED_SLOTS.labels(lot.lot_id).set(occupied)
+    metrics.UPDATE_SECONDS.observe(time.perf_counter() - started)
+    if changed:
+        metrics.STATUS_CHANGES.labels(lot.lot_id).inc()
+        print(f"Updated State [{lot.lot_id}]: {status_string}")
+        # Wake up SSE streams and long-polls waiting on this lot
+        status_notifier.notify(lot.lot_id)
+    return status_string
+
+async def fetch_edge(client, camera):
+    """
+    GETs one camera's detections. Returns (fresh, detections): on failure the
+    camera keeps its last points (None) until they are EDGE_STALE_AFTER old,
+    then it is cleared ([]).
+    """
+    started = time.perf_counter()
+    try:
+        # wait_for caps the WHOLE request, not just each connect/read step
+        response = await asyncio.wait_for(client.get(camera.edge_url), EDGE_TIMEOUT)
+        metrics.FETCH_SECONDS.labels(camera.camera_id).observe(time.perf_counter() - started)
+        # An edge error (500, {"detail": ...}) is a failed fetch, NOT a frame with no cars
+        response.raise_for_status()
+        detections = response.json()
+        # model/server.py may wrap the list: {"status": ..., "vehicles": [...]}
+        if isinstance(detections, dict):
+            if 'vehicles' not in detections:
+                raise ValueError(f"No 'vehicles' in the edge's answer: {str(detections)[:200]}")
+            detections = detections['vehicles']
+        if not isinstance(detections, list):
+            raise ValueError(f"Expected a list of detections, got {type(detections).__name__}")
+        return True, detections
+    except Exception as e:
+        metrics.FETCH_ERRORS.labels(camera.camera_id).inc()
+        print(f"Error fetching from Vision Edge {camera.camera_id} ({camera.edge_url}): {e!r}")
+        return False, (None if time.time() - camera.updated_at < EDGE_STALE_AFTER else [])
+
+async def poll_edges_once(client, polled_cameras):
+    """Fetches ALL cameras concurrently, then updates every lot in parallel on the worker pool."""
+    # Expected format per edge: [{"x": 200, "y": 450, "type": "car"}, ...]
+    with profiler.span("fetch_edges"):
+        results = await asyncio.gather(*(fetch_edge(client, camera) for camera in polled_cameras))
+
+    by_lot = {}
+    for camera, (fresh, detections) in zip(polled_cameras, results):
+        by_lot.setdefault(camera.lot_id, []).append((fresh, camera, detections))
+
+    loop = asyncio.get_running_loop()
+    jobs = []
+    for lot_id, entries in by_lot.items():
+        # If every camera of a lot failed, keep its current state rather than blanking it
+        if any(fresh for fresh, _, _ in entries):
+            camera_results = [(camera, detections) for _, camera, detections in entries]
+            jobs.append(loop.run_in_executor(lot_pool, update_lot, registry.lots[lot_id], camera_results))
+    with profiler.span("update_lots"):
+        outcomes = await asyncio.gather(*jobs, return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            print(f"Error processing detections: {outcome}")
+
+def show_debug_windows(last_shown_ticks):
+    """One cv2 window per lot, redrawn only when that lot has a new tick."""
+    for lot in registry.lots.values():
+        tick, views, slot_indices = lot.latest_view
+        if last_shown_ticks.get(lot.lot_id) != tick:
+            last_shown_ticks[lot.lot_id] = tick
+            with metrics.RENDER_SECONDS.time(), profiler.span("render"):
+                frame = render_view(lot.base_map, view_map_points(views), slot_indices)
+            cv2.imshow(f"Backend Brain - God Mode [{lot.lot_id}]", frame)
+    cv2.waitKey(1) # Required to update the window
+
+async def poll_edges_forever():
+    """
+    Fetches ALL edges concurrently over one pooled client -> updates lots.
+    The tick takes as long as the slowest edge (capped by EDGE_TIMEOUT), not the sum.
+    """
+    last_shown_ticks = {}
+    polled_cameras = [camera for camera in registry.cameras.values() if camera.edge_url]
+    pool_size = max(len(polled_cameras), 1)
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        while True:
+            profiler.tick()
+            if POLL_EDGE and polled_cameras:
+                with metrics.POLL_TICK_SECONDS.time():
+                    await poll_edges_once(client, polled_cameras)
+
+            # --- SHOW THE DEBUG WINDOWS (Desktop only) ---
+            # cv2 windows must be driven from one thread, so pushed batches are shown here too
+            if not HEADLESS:
+                try:
+                    show_debug_windows(last_shown_ticks)
+                except Exception as e:
+                    print(f"Error showing debug window (set HEADLESS = True on servers): {e}")
+
+            # Don't spam the network; wait a bit (pushes don't wait for this)
+            await asyncio.sleep(0.5 if POLL_EDGE else 0.05)
+
+def watched_files(lot):
+    return [path for path in [lot.config_file] + [camera.matrix_file for camera in lot.cameras] if path]
+
+def file_stamps(paths):
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+def reload_lot(lot):
+    """
+    Re-reads the lot's config.json and its cameras' matrix.npy. The new slot
+    index and rasters are built here, on the calling thread, while ticks carry
+    on with the old ones; then everything is swapped in one go under the lot's
+    lock. Returns what changed (e.g. ["config", "cam_0"]), [] for nothing.
+    """
+    plan = lot.prepare_reload()
+    if plan is None:
+        return []
+    with lot.lock:
+        changed = lot.apply_reload(plan)
+        status_string = lot.status_string
+    print(f"Reloaded [{lot.lot_id}] ({', '.join(plan['changed'])}): {status_string}")
+    if changed:
+        status_notifier.notify(lot.lot_id)
+    return plan["changed"]
+
+def config_watch_loop():
+    """
+    Polls the config/matrix files of every lot. A file must look the same on
+    two checks in a row before it is reloaded, so a half-written file (the
+    calibration script still saving) is never picked up.
+    """
+    applied = {lot.lot_id: file_stamps(watched_files(lot)) for lot in registry.lots.values()}
+    last_seen = dict(applied)
+    while True:
+        time.sleep(CONFIG_WATCH_INTERVAL)
+        for lot in registry.lots.values():
+            stamps = file_stamps(watched_files(lot))
+            if stamps != last_seen[lot.lot_id]:
+                last_seen[lot.lot_id] = stamps  # Still changing: check again next time
+                continue
+            if stamps != applied[lot.lot_id]:
+                applied[lot.lot_id] = stamps
+                try:
+                    reload_lot(lot)
+                except Exception as e:
+                    print(f"Reload of [{lot.lot_id}] failed, keeping the old setup: {e!r}")
+
+def processing_loop():
+    """
+    Runs in background: Fetches from every edge (if POLL_EDGE) -> updates lots,
+    and keeps the desktop debug windows fresh.
+    """
+    asyncio.run(poll_edges_forever())
+
+async def watch_shared_state():
+    """API workers: wakes long-polls and SSE streams when the engine publishes a new version."""
+    versions = {lot_id: lot.version for lot_id, lot in registry.lots.items()}
+    while True:
+        await asyncio.sleep(SHARED_POLL_INTERVAL)
+        for lot_id, lot in registry.lots.items():
+            version = lot.version
+            if version != versions[lot_id]:
+                versions[lot_id] = version
+                status_notifier.notify(lot_id)
+
+@asynccontextmanager
+async def lifespan(app):
+    status_notifier.attach(asyncio.get_running_loop())
+    if ROLE == "api":
+        watcher = asyncio.create_task(watch_shared_state())
+        yield
+        watcher.cancel()
+        await engine_client.aclose()
+        return
+    # Start the background processing thread
+    processor_thread = Thread(target=processing_loop, name="processing", daemon=True)
+    processor_thread.start()
+    if CONFIG_WATCH_INTERVAL:
+        Thread(target=config_watch_loop, daemon=True).start()
+    yield
+    lot_pool.shutdown(wait=False)
+    if recorder:
+        recorder.close()
+    profiler.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# --- MULTI-WORKER: what only the engine can answer ---
+# Pushes and admin calls change the engine's state; history, debug view and
+# metrics live there. API workers pass these requests on over localhost.
+ENGINE_ONLY_PREFIXES = ("/api/detections", "/api/admin/", "/debug/", "/metrics")
 
-app = FastAPI()
+def engine_only(path):
+    return path.startswith(ENGINE_ONLY_PREFIXES) or (path.startswith("/api/lots/") and "/history/" in path)
+
+if ROLE == "api":
+    engine_client = httpx.AsyncClient(base_url=ENGINE_URL, timeout=httpx.Timeout(30.0, read=None))
+
+    @app.middleware("http")
+    async def forward_to_engine(request: Request, call_next):
+        if not engine_only(request.url.path):
+            return await call_next(request)
+        engine_request = engine_client.build_request(
+            request.method, request.url.path, params=request.query_params, content=await request.body(),
+            headers={key: value for key, value in request.headers.items() if key in ("content-type", "accept")})
+        try:
+            engine_response = await engine_client.send(engine_request, stream=True)
+        except httpx.HTTPError as e:
+            return JSONResponse({"detail": f"Engine unreachable: {e!r}"}, status_code=502)
+        # Streamed through, so the MJPEG debug stream works from the workers too
+        return StreamingResponse(engine_response.aiter_raw(), status_code=engine_response.status_code,
+                                 media_type=engine_response.headers.get("content-type"),
+                                 background=BackgroundTask(engine_response.aclose))
 
 # --- PASTE THIS BLOCK EXACTLY ---
 app.add_middleware(
@@ -18,116 +370,354 @@ app.add_middleware(
     allow_headers=["*"],  # Allows ALL headers (Content-Type, ngrok-skip, etc.)
 )
 
-# --- CONFIGURATION ---
-FRIEND_LAPTOP_URL = "http://localhost:5000/detections"
-# FRIEND_LAPTOP_URL = "https://mugwumpian-scottie-homely.ngrok-free.dev/get_coords"
-MATRIX_FILE = "matrix.npy"
-SLOTS_CONFIG_FILE = "./config.json"
-# ---------------------
+# --- API ENDPOINTS FOR FRONTEND ---
+
+@app.get("/api/lots")
+def list_lots():
+    """Every lot this backend serves."""
+    return [
+        {"lot_id": lot.lot_id, "lot_name": lot.config.get('lot_name'), "slots": len(lot.config['slots'])}
+        for lot in registry.lots.values()
+    ]
+
+def status_payload(lot, fmt="full", since=None):
+    """
+    The lot's status in one of status_codec.FORMATS, with server-side counts:
+    - full:   the status string, one character per slot
+    - bitset: base64 occupancy bits + 2-bit vehicle classes (see status_codec)
+    - delta:  only [[slot_index, new_code], ...] changed since the status token
+              `since` (falls back to the full string when that version is too
+              old, or from before a restart)
+    "token" is what to pass back as ?since= next time. "availability" carries the
+    per type/zone counters too, so live views don't fetch them on every change.
+    """
+    epoch = lot.epoch
+    version, status_string, counts, availability = lot.latest()
+    payload = {"lot_id": lot.lot_id, "version": version, "token": status_token(epoch, version), "counts": counts,
+               "availability": availability}
 
-# Load Configuration ONCE
-with open(SLOTS_CONFIG_FILE, 'r') as f:
-    master_config = json.load(f)
+    since_version = token_version(since, epoch)
+    if fmt == "delta" and since_version is not None:
+        changes = lot.changes_since(since_version, status_string)
+        if changes is not None:
+            payload.update({"format": "delta", "since": since, "changes": changes})
+            return payload
+    if fmt == "bitset":
+        payload.update({"format": "bitset", **encode_bitset(status_string)})
+        return payload
 
-# Load Matrix
-try:
-    h_matrix = np.load(MATRIX_FILE)
-except:
-    print("CRITICAL ERROR: Matrix file not found. Run calibration first.")
-    h_matrix = np.eye(3) # Fallback to prevent crash
+    payload.update({"format": "full", "status_string": status_string})
+    return payload
 
-# GLOBAL STATE (The String)
-# We initialize it with all '0's based on number of slots
-current_status_string = "0" * len(master_config['slots'])
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
 
-def point_in_rect(x, y, rx, ry, rw, rh):
-    """Simple check if a point (x,y) is inside a rectangle."""
-    return (rx <= x <= rx + rw) and (ry <= y <= ry + rh)
+def config_response(lot, request):
+    """The config rarely changes, so clients revalidate with If-None-Match and get a 304."""
+    headers = {"ETag": lot.config_etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, lot.config_etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(lot.config, headers=headers)
 
-def processing_loop():
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+async def status_response(lot, request, since, wait, fmt):
     """
-    Runs in background: Fetches from Friend -> Transforms -> Updates String
+    Plain poll, conditional poll (If-None-Match -> 304) or long-poll.
+    Long-poll: pass the token you have (?since=<token> or If-None-Match) and ?wait=seconds;
+    the request is held until the status changes or the wait runs out (-> 304).
+    With ?format=delta the answer only holds the slots changed since ?since=<token>.
+    A token from before a restart never matches: the client gets the full status.
     """
-    global current_status_string
-    
-    while True:
-        try:
-            # 1. GET Raw Coords from Friend's Vision System
-            # Expected format: [{"x": 200, "y": 450, "type": "car"}, ...]
-            response = requests.get(FRIEND_LAPTOP_URL, timeout=1)
-            raw_detections = response.json()
-
-            # --- VISUALIZATION SETUP (New) ---
-            # Load the map image to draw on
-            debug_map = cv2.imread("st_thomas_top_down.png") # Make sure path is correct!
-            # ---------------------------------
-
-            slot_status = ['0'] * len(master_config['slots'])
-
-            for det in raw_detections:
-                # Defensive check
-                if 'x' not in det: continue
-
-                # Transform Logic
-                point_vector = np.array([[[det['x'], det['y']]]], dtype=np.float32)
-                transformed = cv2.perspectiveTransform(point_vector, h_matrix)
-                
-                map_x = int(transformed[0][0][0])
-                map_y = int(transformed[0][0][1])
-
-                # --- DRAW THE CAR (New) ---
-                # Draw a Red Dot where the backend thinks the car is
-                cv2.circle(debug_map, (map_x, map_y), 5, (0, 0, 255), -1) 
-                # --------------------------
-
-                # 3. Check which slot this point falls into
-                for index, slot in enumerate(master_config['slots']):
-                    coords = slot['coordinates']
-                    
-                    # Draw the Slot Box (Green) for reference
-                    cv2.rectangle(debug_map, 
-                                  (coords['x'], coords['y']), 
-                                  (coords['x']+coords['w'], coords['y']+coords['h']), 
-                                  (0, 255, 0), 1)
-
-                    if point_in_rect(map_x, map_y, coords['x'], coords['y'], coords['w'], coords['h']):
-                        slot_status[index] = '1'
-                        # If hit, draw the dot Green to show success
-                        cv2.circle(debug_map, (map_x, map_y), 5, (0, 255, 0), -1)
-                        break 
-
-            # 4. Update String
-            current_status_string = "".join(slot_status)
-            print(f"Updated State: {current_status_string}")
-
-            # --- SHOW THE DEBUG WINDOW (New) ---
-            # Resize if huge
-            debug_map = cv2.resize(debug_map, (800, 600)) 
-            cv2.imshow("Backend Brain - God Mode", debug_map)
-            cv2.waitKey(1) # Required to update the window
-        except Exception as e:
-            print(f"Error fetching from Vision Edge: {e}")
-        
-        # Don't spam the network; wait a bit
-        time.sleep(0.5)
+    check_format(fmt)
+    wait = min(max(wait, 0.0), LONG_POLL_MAX_WAIT)
+    since_version = token_version(since, lot.epoch)
+    known_current = (since_version is not None and since_version == lot.version) or \
+        etag_matches(request, lot.status_etag(fmt))
 
-# Start the background processing thread
-processor_thread = Thread(target=processing_loop, daemon=True)
-processor_thread.start()
+    if known_current and wait > 0:
+        deadline = time.monotonic() + wait
+        start_version = lot.version
+        while lot.version == start_version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await status_notifier.wait(lot.lot_id, remaining):
+                break
+        known_current = lot.version == start_version
 
-# --- API ENDPOINTS FOR FRONTEND ---
+    payload = status_payload(lot, fmt, since)
+    headers = {"ETag": lot.status_etag(fmt, payload["version"]), "Cache-Control": "no-cache"}
+    if known_current:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
 
-@app.get("/api/config")
-def get_config():
+def status_stream_response(lot, request, fmt):
+    """
+    Server-Sent Events: one "status" event now, then one per change. Nothing is
+    sent while the status stays the same, apart from a keep-alive comment.
+    With ?format=delta each event after the first only holds the changed slots.
+    """
+    check_format(fmt)
+
+    async def events():
+        # Event ids are status tokens: a browser reconnecting with the id of an
+        # event from before a restart gets a full snapshot, not a delta
+        sent_token = request.headers.get("last-event-id") or None
+
+        while True:
+            if token_version(sent_token, lot.epoch) != lot.version:
+                payload = status_payload(lot, fmt, sent_token)
+                sent_token = payload["token"]
+                yield f"id: {sent_token}\nevent: status\ndata: {json.dumps(payload)}\n\n"
+            elif not await status_notifier.wait(lot.lot_id, SSE_KEEPALIVE):
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+@app.get("/api/lots/{lot_id}/config")
+def get_lot_config(lot_id: str, request: Request):
     """Frontend calls this ONCE on load to know where to draw boxes."""
-    return master_config
+    return config_response(get_lot(lot_id), request)
+
+@app.get("/api/lots/{lot_id}/status")
+async def get_lot_status(lot_id: str, request: Request, since: Optional[str] = None, wait: float = 0,
+                         fmt: str = Query("full", alias="format")):
+    """Frontend calls this to color the boxes (ETag, long-poll and formats: see status_response)."""
+    return await status_response(get_lot(lot_id), request, since, wait, fmt)
+
+@app.get("/api/lots/{lot_id}/status/stream")
+def stream_lot_status(lot_id: str, request: Request, fmt: str = Query("full", alias="format")):
+    """Pushes the status to the frontend whenever it changes (SSE)."""
+    return status_stream_response(get_lot(lot_id), request, fmt)
+
+@app.get("/api/config")
+def get_config(request: Request):
+    """Single-lot frontends (index.html, script.js): config of the default lot."""
+    return config_response(registry.default_lot, request)
 
 @app.get("/api/status")
-def get_status():
-    """Frontend calls this repeatedly to color the boxes."""
-    return {
-        "lot_id": master_config['lot_id'],
-        "status_string": current_status_string
-    }
+async def get_status(request: Request, since: Optional[str] = None, wait: float = 0,
+                     fmt: str = Query("full", alias="format")):
+    """Single-lot frontends (index.html, script.js): status of the default lot."""
+    return await status_response(registry.default_lot, request, since, wait, fmt)
+
+@app.get("/api/status/stream")
+def stream_status(request: Request, fmt: str = Query("full", alias="format")):
+    """Single-lot frontends: SSE stream of the default lot's status."""
+    return status_stream_response(registry.default_lot, request, fmt)
+
+# --- AVAILABILITY (signage boards, map view) ---
+
+def availability_response(lot, request):
+    """
+    Free/occupied slots per slot type ("type" in config.json) and per zone
+    ("zone", optional). The counters move with every slot change, so this is
+    a lookup, not a count. ETag: 304 until the next change.
+    """
+    version, availability = lot.latest_availability()
+    headers = {"ETag": lot.status_etag("availability", version), "Cache-Control": "no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"lot_id": lot.lot_id, "version": version, **availability}, headers=headers)
+
+@app.get("/api/lots/{lot_id}/availability")
+def get_lot_availability(lot_id: str, request: Request):
+    return availability_response(get_lot(lot_id), request)
+
+@app.get("/api/availability")
+def get_availability(request: Request):
+    """Single-lot frontends: availability of the default lot."""
+    return availability_response(registry.default_lot, request)
+
+# --- NEAREST FREE SLOT (guidance displays, mobile clients) ---
+
+def nearest_free_response(lot, x, y, entrance, slot_type, k):
+    """
+    The k nearest free slots (of ?type=..., any type if left out) to a map
+    point (?x=..&y=.. in map pixels, like config.json) or to a named
+    entrance (?entrance=..., from "entrances" in config.json), nearest first.
+    """
+    finder = lot.slot_finder
+    if entrance is not None:
+        if entrance not in finder.entrances:
+            raise HTTPException(status_code=404, detail=f"Unknown entrance '{entrance}'")
+        point = finder.entrances[entrance]
+    elif x is None or y is None:
+        raise HTTPException(status_code=400, detail="Give x and y (map pixels) or an entrance")
+    else:
+        point = (x, y)
+    if slot_type is not None and slot_type not in finder.groups:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(finder.slot_types)}")
+
+    version, slots = nearest_free_slots(lot, point, k, slot_type)
+    return {"lot_id": lot.lot_id, "version": version, "point": list(point), "type": slot_type, "slots": slots}
+
+@app.get("/api/lots/{lot_id}/nearest_free")
+def get_lot_nearest_free(lot_id: str, x: Optional[float] = None, y: Optional[float] = None,
+                         entrance: Optional[str] = None, slot_type: Optional[str] = Query(None, alias="type"),
+                         k: int = Query(5, ge=1, le=100)):
+    return nearest_free_response(get_lot(lot_id), x, y, entrance, slot_type, k)
+
+@app.get("/api/nearest_free")
+def get_nearest_free(x: Optional[float] = None, y: Optional[float] = None, entrance: Optional[str] = None,
+                     slot_type: Optional[str] = Query(None, alias="type"), k: int = Query(5, ge=1, le=100)):
+    """Single-lot frontends: nearest free slots in the default lot."""
+    return nearest_free_response(registry.default_lot, x, y, entrance, slot_type, k)
+
+# --- HISTORY (capacity planning) ---
+# Times are Unix seconds. Default range: the last 7 days.
+
+def history_log_of(lot_id):
+    lot = get_lot(lot_id)
+    if lot.history_log is None:
+        raise HTTPException(status_code=404, detail="History is off (HISTORY_DIR = None)")
+    return lot, lot.history_log
+
+def history_range(start, end):
+    end = min(time.time(), end) if end is not None else time.time()
+    start = start if start is not None else end - 7 * 24 * 3600
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@app.get("/api/lots/{lot_id}/history/occupancy")
+def get_occupancy_history(lot_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                          step: float = Query(3600, gt=0)):
+    """Occupied slots over time, in buckets of `step` seconds (average and max)."""
+    lot, log = history_log_of(lot_id)
+    start, end = history_range(start, end)
+    if (end - start) / step > 100_000:
+        raise HTTPException(status_code=400, detail="Too many buckets, use a bigger step")
+    return {"lot_id": lot.lot_id, "total_slots": len(lot.slot_rects), "step": step,
+            "buckets": log.occupancy(start, end, step)}
+
+@app.get("/api/lots/{lot_id}/history/dwell")
+def get_dwell_times(lot_id: str, start: Optional[float] = None, end: Optional[float] = None):
+    """How long cars stay, per slot (sessions that started and ended in the range)."""
+    lot, log = history_log_of(lot_id)
+    start, end = history_range(start, end)
+    return {"lot_id": lot.lot_id, "slots": log.dwell_times(start, end)}
+
+@app.get("/api/lots/{lot_id}/history/peak_hours")
+def get_peak_hours(lot_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                   utc_offset_hours: float = 0.0):
+    """Average utilisation per hour of the day (local time = UTC + utc_offset_hours)."""
+    lot, log = history_log_of(lot_id)
+    start, end = history_range(start, end)
+    return {"lot_id": lot.lot_id, "hours": log.peak_hours(start, end, len(lot.slot_rects), utc_offset_hours)}
+
+# --- API ENDPOINTS FOR EDGE NODES ---
+
+class Detection(BaseModel):
+    """One detection in camera pixels. With a box size (w, h), x/y are the box centre."""
+    x: float
+    y: float
+    w: Optional[float] = None
+    h: Optional[float] = None
+    type: str = "car"
+
+@app.post("/api/detections")
+def ingest_detections(detections: list[Detection], camera_id: Optional[str] = None):
+    """
+    Edge nodes (simulator.py, model/app.py) push each frame's detections here.
+    Format: [{"x": 200, "y": 450, "type": "car"}, ...], optionally with the
+    box size ("w", "h"; x/y are then the box centre) for footprint matching.
+    ?camera_id=cam_0 picks the camera (and so the homography and lot); the first
+    camera is used when it is left out. The lot's status string is recomputed
+    right away, no polling delay.
+    """
+    if camera_id is None:
+        if not registry.cameras:
+            raise HTTPException(status_code=400, detail="No cameras configured to take detections")
+        camera = next(iter(registry.cameras.values()))
+    elif camera_id in registry.cameras:
+        camera = registry.cameras[camera_id]
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown camera '{camera_id}'")
+
+    lot = registry.lots[camera.lot_id]
+    # Bad items (no y, "x": "a") were already turned away with a 422
+    raw_detections = [detection.model_dump(exclude_none=True) for detection in detections]
+    status_string = update_lot(lot, [(camera, raw_detections)])
+    return {"status": "success", "lot_id": lot.lot_id, "status_string": status_string}
+
+# --- ADMIN ---
+
+@app.post("/api/admin/reload")
+def reload_config(lot_id: Optional[str] = None):
+    """
+    Reloads config.json / matrix.npy of one lot (?lot_id=...) or of all of
+    them right now, without a restart. Same as what the file watcher does.
+    """
+    lots = [get_lot(lot_id)] if lot_id else list(registry.lots.values())
+    reloaded = {}
+    for lot in lots:
+        try:
+            reloaded[lot.lot_id] = reload_lot(lot)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Reload of '{lot.lot_id}' failed, old setup kept: {e}")
+    return {"status": "success", "reloaded": reloaded}
+
+@app.post("/api/admin/profile")
+def set_profiling(mode: Optional[str] = None, every: int = PROFILE_EVERY):
+    """
+    Switches profiling of the processing loop on (?mode=spans or ?mode=stacks,
+    one tick out of ?every=...) or off (no mode). Files go to PROFILE_DIR;
+    turning it off writes them one last time.
+    """
+    global profiler
+    if mode is not None and mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}' (use one of {PROFILE_MODES})")
+    old_profiler = profiler
+    profiler = make_profiler("backend", mode, every, PROFILE_DIR, PROFILE_THREADS)
+    old_profiler.close()
+    return {"status": "success", "mode": mode, "every": every,
+            "files": profiler.files if profiler.enabled else old_profiler.files}
+
+# --- METRICS ---
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint (text format). See metrics.py for what is in it."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# --- DEBUG VIEW ("God Mode") ---
+
+def render_latest(lot, ext):
+    _, views, slot_indices = lot.latest_view
+    with metrics.RENDER_SECONDS.time():
+        frame = render_view(lot.base_map, view_map_points(views), slot_indices)
+    return encode_image(frame, ext)
+
+@app.get("/debug/god_mode.png")
+def get_god_mode_snapshot(lot_id: Optional[str] = None):
+    """One PNG of the debug view (?lot_id=..., default lot otherwise), rendered on request."""
+    lot = get_lot(lot_id) if lot_id else registry.default_lot
+    return Response(content=render_latest(lot, ".png"), media_type="image/png")
+
+@app.get("/debug/god_mode.mjpg")
+async def get_god_mode_stream(lot_id: Optional[str] = None):
+    """
+    MJPEG stream of the debug view. Frames are only rendered while a client
+    is connected, and only when a new tick has come in.
+    """
+    lot = get_lot(lot_id) if lot_id else registry.default_lot
+
+    async def frames():
+        last_tick = -1
+        while True:
+            if lot.latest_view[0] != last_tick:
+                last_tick = lot.latest_view[0]
+                jpeg = await asyncio.to_thread(render_latest, lot, ".jpg")
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n")
+            await asyncio.sleep(1 / DEBUG_STREAM_FPS)
+
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace; boundary=frame")
 
 # Run with: uvicorn backend_brain:app --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from lot_registry import Camera, Lot, Registry
+from lot_setup import apply_matching_settings
+from synthetic_lot import make_lot_config, make_homography, detection_stream
+
+# Times the backend's per-tick path on synthetic lots, without any HTTP in the
+# way: the real Camera.set_detections() + Lot.recompute() that update_lot()
+# runs, with the production matching settings from lot_setup.py (slot raster,
+# footprints, smoothing) plus availability counters, the occupancy log and
+# (optionally) the shared-state publish.
+# Run with: python benchmark.py
+
+# --- CONFIGURATION ---
+LOT_SIZES = [100, 1_000, 10_000, 100_000]   # Slots per lot
+OCCUPANCY = 0.7                 # Cars per slot in the detection stream
+CAMERAS = 1                     # Cameras per lot (each sees all the cars, like overlapping views)
+TICKS = 100                     # Timed ticks per lot size
+WARMUP_TICKS = 20               # Untimed ticks first (caches, allocator)
+SEED = 0
+RESULTS_FILE = "benchmark_results.json"  # Written after every run (None = don't)
+BASELINE_FILE = None            # An older RESULTS_FILE to compare against, e.g. from main
+REGRESSION_TOLERANCE = 1.2      # Flag lot sizes whose p50 tick got this much slower
+CAMERA_SIZE = (1920, 1080)
+BOXES = True                    # Detections with box sizes, like model/app.py sends (matched by footprint if lot_setup.py turns it on)
+HISTORY = True                  # Log transitions to an occupancy log (the backend's HISTORY_DIR)
+SHARED_STATE = False            # Also publish to shared memory (python serve.py's engine)
+# ---------------------
+
+STAGES = ["set_detections", "transform", "match", "recompute", "tick"]
+
+
+def build_lot(num_slots, work_dir):
+    config = make_lot_config(num_slots, seed=SEED)
+    registry = Registry()
+    lot = Lot(config['lot_id'], config)
+    registry.add_lot(lot)
+    for index in range(CAMERAS):
+        h_matrix = make_homography(config, CAMERA_SIZE, seed=SEED + index)
+        registry.add_camera(Camera(f"cam_{index}", lot.lot_id, h_matrix, frame_size=CAMERA_SIZE))
+    apply_matching_settings(registry, raster_cache_dir=None)
+    if HISTORY:
+        lot.enable_history(os.path.join(work_dir, f"{lot.lot_id}.log"))
+    if SHARED_STATE:
+        lot.enable_shared_state(work_dir)
+    return lot
+
+
+def run_tick(lot, camera_batches, timings):
+    """One backend update: what update_lot() does under the lot's lock."""
+    now = time.time()
+    start = time.perf_counter()
+    transform = match = 0.0
+    for camera, raw_detections in zip(lot.cameras, camera_batches):
+        camera.set_detections(raw_detections, now)
+        transform += camera.transform_seconds
+        match += camera.match_seconds
+    detected = time.perf_counter()
+    lot.recompute()
+    done = time.perf_counter()
+
+    for stage, seconds in zip(STAGES, (detected - start, transform, match, done - detected, done - start)):
+        timings[stage].append(seconds)
+
+
+def benchmark_lot(num_slots):
+    work_dir = tempfile.mkdtemp(prefix="parking_benchmark_")
+    lot = build_lot(num_slots, work_dir)
+    try:
+        return measure_lot(lot, num_slots)
+    finally:
+        if lot.history_log is not None:
+            lot.history_log.close()
+        if lot.shared is not None:
+            lot.shared.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def measure_lot(lot, num_slots):
+    num_cars = int(num_slots * OCCUPANCY)
+    # Ticks are generated one at a time (100k-car ticks don't all fit in RAM);
+    # only run_tick() is timed
+    streams = [detection_stream(lot.config, camera.h_matrix, num_cars, WARMUP_TICKS + TICKS,
+                                seed=SEED + index, boxes=BOXES)
+               for index, camera in enumerate(lot.cameras)]
+
+    timings = {stage: [] for stage in STAGES}
+    warmup = {stage: [] for stage in STAGES}
+    for tick, camera_batches in enumerate(zip(*streams)):
+        run_tick(lot, camera_batches, warmup if tick < WARMUP_TICKS else timings)
+
+    tick_times = np.array(timings["tick"])
+    return {
+        "slots": num_slots,
+        "cars": num_cars,
+        "cameras": CAMERAS,
+        "ticks_per_second": round(float(len(tick_times) / tick_times.sum()), 1),
+        "detections_per_second": round(float(num_cars * CAMERAS * len(tick_times) / tick_times.sum()), 1),
+        "occupied": lot.counts["occupied"],
+        # Milliseconds
+        "p50": {stage: round(float(np.percentile(timings[stage], 50)) * 1000, 4) for stage in STAGES if timings[stage]},
+        "p99": {stage: round(float(np.percentile(timings[stage], 99)) * 1000, 4) for stage in STAGES if timings[stage]},
+    }
+
+
+def print_results(results, baseline=None):
+    print(f"{'slots':>8} {'cars':>8} {'ticks/s':>10} {'p50 ms':>9} {'p99 ms':>9}   "
+          f"p50 set_detections (transform / match) / recompute (ms)")
+    for result in results:
+        p50, p99 = result["p50"], result["p99"]
+        line = (f"{result['slots']:>8} {result['cars']:>8} {result['ticks_per_second']:>10} "
+                f"{p50['tick']:>9.3f} {p99['tick']:>9.3f}   "
+                f"{p50['set_detections']:.3f} ({p50['transform']:.3f} / {p50['match']:.3f}) / "
+                f"{p50['recompute']:.3f}")
+        old = (baseline or {}).get(str(result["slots"]))
+        if old:
+            ratio = p50['tick'] / old["p50"]["tick"] if old["p50"]["tick"] else 1.0
+            line += f"   x{ratio:.2f} vs baseline"
+            if ratio > REGRESSION_TOLERANCE:
+                line += "  <-- REGRESSION"
+        print(line)
+
+
+def main():
+    baseline = None
+    if BASELINE_FILE and os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r') as f:
+            baseline = {str(result["slots"]): result for result in json.load(f)["results"]}
+
+    results = []
+    for num_slots in LOT_SIZES:
+        print(f"Benchmarking {num_slots} slots...")
+        results.append(benchmark_lot(num_slots))
+    print_results(results, baseline)
+
+    if RESULTS_FILE:
+        with open(RESULTS_FILE, 'w') as f:
+            json.dump({"created": time.time(), "ticks": TICKS, "results": results}, f, indent=4)
+        print(f"Saved to {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
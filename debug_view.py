@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+# Size of the "God Mode" debug view (same as the old cv2.imshow window)
+VIEW_SIZE = (800, 600)
+
+
+def build_base_map(image_path, slot_rects):
+    """
+    Loads the top-down map ONCE and draws every slot box (green) on it.
+    Falls back to a black canvas if the image is missing, so headless
+    servers without the asset still get a usable view.
+    """
+    base_map = cv2.imread(image_path) if image_path else None
+    if base_map is None:
+        print(f"Warning: Could not load {image_path}, debug view uses a blank map.")
+        if len(slot_rects):
+            width, height = slot_rects[:, 2:].max(axis=0).astype(int) + 1
+        else:
+            width, height = VIEW_SIZE
+        base_map = np.zeros((height, width, 3), dtype=np.uint8)
+
+    for x1, y1, x2, y2 in slot_rects.astype(int):
+        cv2.rectangle(base_map, (x1, y1), (x2, y2), (0, 255, 0), 1)
+    return base_map
+
+
+def render_view(base_map, map_points, slot_indices):
+    """
+    Draws the cars on a copy of the cached base map.
+    Red Dot = where the backend thinks the car is, Green = it hit a slot.
+    """
+    debug_map = base_map.copy()
+    for (map_x, map_y), slot_index in zip(map_points.astype(int), slot_indices):
+        color = (0, 255, 0) if slot_index >= 0 else (0, 0, 255)
+        cv2.circle(debug_map, (int(map_x), int(map_y)), 5, color, -1)
+    return cv2.resize(debug_map, VIEW_SIZE)
+
+
+def encode_image(image, ext=".jpg"):
+    """Encodes a rendered view to bytes (.jpg for MJPEG, .png for snapshots)."""
+    ok, buffer = cv2.imencode(ext, image)
+    if not ok:
+        raise ValueError(f"Could not encode debug view as {ext}")
+    return buffer.tobytes()
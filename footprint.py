@@ -0,0 +1,159 @@
+import cv2
+import numpy as np
+
+# Occupancy from whole detection boxes instead of one centre point.
+# The bottom strip of a camera box is where the vehicle touches the ground;
+# projected onto the map it becomes a quad, and every slot it covers enough
+# of is occupied. A bus across two slots marks both.
+
+# Vertices kept per clipped polygon: a quad clipped by a rect's 4 sides has at most 8
+MAX_VERTICES = 8
+# Footprints spanning more grid cells than this are ignored (boxes near the
+# horizon blow up to absurd sizes on the map)
+MAX_FOOTPRINT_CELLS = 64
+
+
+def footprint_quads(boxes, ground_share=0.3):
+    """
+    Camera-space ground-contact quads of [x_centre, y_centre, w, h] boxes
+    (YOLO's xywh): the bottom `ground_share` of each box. Returns (M, 4, 2).
+    """
+    x, y, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    left, right = x - w / 2, x + w / 2
+    bottom = y + h / 2
+    top = bottom - h * ground_share
+    return np.stack([np.stack([left, top], 1), np.stack([right, top], 1),
+                     np.stack([right, bottom], 1), np.stack([left, bottom], 1)], axis=1).astype(np.float32)
+
+
+def project_quads(quads, h_matrix):
+    """Camera quads -> map quads, every corner in one cv2 call."""
+    if len(quads) == 0:
+        return np.zeros((0, 4, 2), dtype=np.float32)
+    return cv2.perspectiveTransform(quads.reshape(-1, 1, 2), h_matrix).reshape(-1, 4, 2)
+
+
+def polygon_area(polygons):
+    """Shoelace area of (P, K, 2) polygons (repeated vertices add nothing)."""
+    x, y = polygons[..., 0], polygons[..., 1]
+    return 0.5 * np.abs((x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1))
+
+
+def _clip(polygons, count, axis, limit, keep_above):
+    """
+    One Sutherland-Hodgman step for P polygons at once: keeps the side of the
+    line coord[axis] = limit[p] that is >= (keep_above) or <= it.
+    Polygons are padded to a fixed size by repeating their last vertex.
+    """
+    num, size = polygons.shape[:2]
+    current = polygons
+    # Each real vertex's successor wraps back to vertex 0 after the last real one
+    index = np.arange(size)[None, :]
+    successor = np.where(index + 1 < count[:, None], index + 1, 0)
+    following = np.take_along_axis(polygons, successor[..., None], axis=1)
+    side = 1.0 if keep_above else -1.0
+    cur_dist = (current[..., axis] - limit[:, None]) * side
+    next_dist = (following[..., axis] - limit[:, None]) * side
+    cur_in = cur_dist >= 0
+    crosses = (cur_dist >= 0) != (next_dist >= 0)
+
+    t = np.divide(cur_dist, cur_dist - next_dist, out=np.zeros_like(cur_dist), where=crosses)
+    crossing = current + (following - current) * t[..., None]
+
+    # Per edge: [current vertex if inside, crossing point if the edge crosses]
+    candidates = np.stack([current, crossing], axis=2).reshape(num, size * 2, 2)
+    valid = np.stack([cur_in, crosses], axis=2).reshape(num, size * 2)
+    # Padding vertices (beyond count) are not edges
+    real = np.repeat(index < count[:, None], 2, axis=1)
+    valid &= real
+
+    # Move the valid vertices to the front (stable), pad with the last one
+    order = np.argsort(~valid, axis=1, kind='stable')[:, :MAX_VERTICES]
+    clipped = np.take_along_axis(candidates, order[..., None], axis=1)
+    new_count = np.minimum(valid.sum(axis=1), MAX_VERTICES)
+    last = np.take_along_axis(clipped, np.maximum(new_count - 1, 0)[:, None, None], axis=1)
+    padding = np.arange(MAX_VERTICES)[None, :] >= new_count[:, None]
+    clipped = np.where(padding[..., None], last, clipped)
+    return clipped, new_count
+
+
+def intersection_areas(quads, rects):
+    """
+    Area of quads[i] inside rects[i] ([x1, y1, x2, y2]) for every pair, in one
+    vectorized pass (clipping against the rect's 4 sides).
+    """
+    if len(quads) == 0:
+        return np.zeros(0)
+    polygons = np.concatenate([quads, np.repeat(quads[:, -1:], MAX_VERTICES - 4, axis=1)], axis=1)
+    count = np.full(len(quads), 4)
+    for axis, column, keep_above in ((0, 0, True), (0, 2, False), (1, 1, True), (1, 3, False)):
+        polygons, count = _clip(polygons, count, axis, rects[:, column], keep_above)
+    areas = polygon_area(polygons)
+    areas[count < 3] = 0.0
+    return areas
+
+
+def candidate_pairs(map_quads, slot_grid):
+    """
+    (quad index, slot index) pairs whose bounding boxes overlap, found through
+    the grid cells each quad's bounding box covers. Each pair appears once.
+    """
+    if len(map_quads) == 0 or len(slot_grid.slot_rects) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    mins = map_quads.min(axis=1)
+    maxs = map_quads.max(axis=1)
+    first = np.floor((mins - slot_grid.origin) / slot_grid.cell_size).astype(np.int64)
+    last = np.floor((maxs - slot_grid.origin) / slot_grid.cell_size).astype(np.int64)
+    grid_max = np.array([slot_grid.cols - 1, slot_grid.rows - 1])
+    first = np.clip(first, 0, grid_max)
+    last = np.clip(last, 0, grid_max)
+    on_grid = np.all(maxs >= slot_grid.origin, axis=1) & np.all(
+        (mins - slot_grid.origin) / slot_grid.cell_size <= grid_max + 1, axis=1)
+
+    # Every (quad, cell) in each quad's cell range, as one flat list
+    span = last - first + 1
+    cells_per_quad = np.where(on_grid & (span[:, 0] * span[:, 1] <= MAX_FOOTPRINT_CELLS),
+                              span[:, 0] * span[:, 1], 0)
+    quad_ids = np.repeat(np.arange(len(map_quads)), cells_per_quad)
+    within = np.arange(cells_per_quad.sum()) - np.repeat(np.cumsum(cells_per_quad) - cells_per_quad, cells_per_quad)
+    cols = first[quad_ids, 0] + within % span[quad_ids, 0]
+    rows = first[quad_ids, 1] + within // span[quad_ids, 0]
+    slots = slot_grid.cell_slots[rows * slot_grid.cols + cols]          # (n, K), -1 padded
+
+    quad_ids = np.repeat(quad_ids, slots.shape[1])
+    slots = slots.ravel()
+    keep = slots >= 0
+    pairs = np.unique(quad_ids[keep] * len(slot_grid.slot_rects) + slots[keep])
+    quad_ids, slots = np.divmod(pairs, len(slot_grid.slot_rects))
+
+    # Bounding boxes must actually overlap
+    rects = slot_grid.slot_rects[slots]
+    overlap = ((mins[quad_ids, 0] < rects[:, 2]) & (rects[:, 0] < maxs[quad_ids, 0]) &
+               (mins[quad_ids, 1] < rects[:, 3]) & (rects[:, 1] < maxs[quad_ids, 1]))
+    return quad_ids[overlap], slots[overlap]
+
+
+def footprint_hits(map_quads, slot_grid, threshold=0.3):
+    """
+    Slots covered by the footprints: the share of a slot's area under one
+    footprint must reach `threshold`. Returns (hit slot indices, best slot per
+    footprint or -1) - a footprint can occupy several slots.
+    """
+    best = np.full(len(map_quads), -1, dtype=np.int64)
+    quad_ids, slots = candidate_pairs(map_quads, slot_grid)
+    if len(slots) == 0:
+        return np.zeros(0, dtype=np.int64), best
+
+    rects = slot_grid.slot_rects[slots]
+    slot_area = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+    share = intersection_areas(map_quads[quad_ids].astype(np.float64), rects.astype(np.float64))
+    share = np.divide(share, slot_area, out=np.zeros_like(share), where=slot_area > 0)
+
+    hit = share >= threshold
+    # Best slot per footprint (for the debug view): highest share that counts
+    order = np.lexsort((-share, quad_ids))
+    first_of_quad = np.concatenate([[True], quad_ids[order][1:] != quad_ids[order][:-1]])
+    top = order[first_of_quad]
+    best[quad_ids[top]] = np.where(hit[top], slots[top], -1)
+    return np.unique(slots[hit]), best
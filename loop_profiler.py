@@ -0,0 +1,204 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+
+# Opt-in profiling of a processing loop, for when a live box gets slow and
+# there is no debugger to attach. The loop calls tick() once per iteration and
+# wraps its stages in span("name"); only every N-th iteration is recorded.
+#
+# - "spans": every span of a sampled iteration (nested, any thread) goes to
+#   <name>.trace.json (Chrome trace: open in https://ui.perfetto.dev or
+#   chrome://tracing) and <name>.spans.folded (microseconds per span path).
+# - "stacks": a sampler thread grabs the call stack of every thread every
+#   SAMPLE_INTERVAL during sampled iterations -> <name>.stacks.folded.
+# .folded files are "a;b;c count" lines: flamegraph.pl, speedscope.app and
+# inferno all read them.
+#
+# Profiling off = the loop holds DISABLED, whose tick()/span() do nothing.
+
+MAX_EVENTS = 200_000      # Chrome trace events kept (oldest dropped first)
+SAMPLE_INTERVAL = 0.001   # Seconds between stack samples ("stacks" mode)
+WRITE_INTERVAL = 5.0      # Seconds between rewrites of the output files
+
+MODES = ("spans", "stacks")
+
+_NO_SPAN = nullcontext()
+
+
+class NullProfiler:
+    """What a loop holds while profiling is off: every call is a no-op."""
+    enabled = False
+    files = []
+
+    def tick(self):
+        pass
+
+    def span(self, name):
+        return _NO_SPAN
+
+    def close(self):
+        pass
+
+
+DISABLED = NullProfiler()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._open_spans().append(self.name)
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        ended = time.perf_counter()
+        stack = self.profiler._open_spans()
+        self.profiler._record(self.name, ";".join(stack), self.started, ended)
+        stack.pop()
+
+
+class LoopProfiler:
+    """
+    Records one loop iteration out of `every` (see the top of this file).
+    `threads`: thread name prefixes to sample in "stacks" mode (None = all).
+    Files are rewritten every WRITE_INTERVAL seconds and on close().
+    """
+    enabled = True
+
+    def __init__(self, name, mode="spans", every=100, out_dir="profiles", threads=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}' (use one of {MODES})")
+        self.name = name
+        self.mode = mode
+        self.every = max(int(every), 1)
+        self.out_dir = out_dir
+        self.threads = tuple(threads) if threads else None
+        self.iteration = 0
+        self.sampling = False
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._thread_names = {}
+        self._folded = Counter()  # span/stack path -> microseconds ("spans") or samples ("stacks")
+        self._origin = time.perf_counter()
+        self._dirty = False
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._worker = threading.Thread(target=self._run, name=f"{name}-profiler", daemon=True)
+        self._worker.start()
+
+    @property
+    def files(self):
+        names = ["trace.json", "spans.folded"] if self.mode == "spans" else ["stacks.folded"]
+        return [os.path.join(self.out_dir, f"{self.name}.{name}") for name in names]
+
+    def tick(self):
+        """Call at the top of every loop iteration: starts (or ends) a sampled one."""
+        self.iteration += 1
+        self.sampling = self.iteration % self.every == 0
+        if self.sampling:
+            self._wake.set()
+
+    def span(self, name):
+        """with profiler.span("match"): ... - recorded only inside a sampled iteration ("spans" mode)."""
+        if not self.sampling or self.mode != "spans":
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def close(self):
+        self.sampling = False
+        self._closed.set()
+        self._wake.set()
+        self._worker.join(WRITE_INTERVAL)
+        self.write()
+
+    def _open_spans(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = [threading.current_thread().name]
+        return stack
+
+    def _record(self, name, path, started, ended):
+        thread_id = threading.get_ident()
+        with self._lock:
+            if thread_id not in self._thread_names:
+                self._thread_names[thread_id] = threading.current_thread().name
+            self._events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": thread_id,
+                                 "ts": round((started - self._origin) * 1e6, 1),
+                                 "dur": round((ended - started) * 1e6, 1),
+                                 "args": {"iteration": self.iteration}})
+            self._folded[path] += max(int((ended - started) * 1e6), 1)
+            self._dirty = True
+
+    def _sample_stacks(self):
+        """One sample of every (matching) thread's Python stack, root first."""
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        samples = []
+        for thread_id, frame in sys._current_frames().items():
+            thread_name = names.get(thread_id, str(thread_id))
+            if thread_id == me or (self.threads and not thread_name.startswith(self.threads)):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            samples.append(thread_name + ";" + ";".join(reversed(stack)))
+        with self._lock:
+            self._folded.update(samples)
+            self._dirty = True
+
+    def _run(self):
+        """Background thread: samples stacks during sampled iterations, writes the files now and then."""
+        last_write = time.monotonic()
+        while not self._closed.is_set():
+            if self.mode == "stacks" and self.sampling:
+                self._sample_stacks()
+                time.sleep(SAMPLE_INTERVAL)
+            else:
+                self._wake.wait(max(WRITE_INTERVAL - (time.monotonic() - last_write), 0.01))
+                self._wake.clear()
+            if time.monotonic() - last_write >= WRITE_INTERVAL:
+                self.write()
+                last_write = time.monotonic()
+
+    def write(self):
+        """Rewrites the output files with everything recorded so far."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            folded = sorted(self._folded.items())
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        lines = "".join(f"{path.replace(' ', '_')} {count}\n" for path, count in folded)
+        outputs = {self.files[-1]: lines}
+        if self.mode == "spans":
+            metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id,
+                         "args": {"name": thread_name}} for thread_id, thread_name in thread_names.items()]
+            outputs[self.files[0]] = json.dumps({"traceEvents": metadata + events, "displayTimeUnit": "ms"})
+        for path, content in outputs.items():
+            # Write then rename, so a reader never sees half a file
+            temp_file = path + ".tmp"
+            with open(temp_file, 'w') as f:
+                f.write(content)
+            os.replace(temp_file, path)
+
+
+def make_profiler(name, mode=None, every=100, out_dir="profiles", threads=None):
+    """A LoopProfiler, or DISABLED when mode is None."""
+    if not mode:
+        return DISABLED
+    return LoopProfiler(name, mode, every, out_dir, threads)
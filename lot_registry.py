@@ -0,0 +1,463 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+from slot_matcher import (build_slot_rects, detections_to_boxes, transform_points,
+                          SlotGrid, status_from_matches)
+from slot_raster import SlotRaster
+from footprint import footprint_quads, project_quads, footprint_hits
+from debug_view import build_base_map
+from status_codec import count_status, diff_status, status_array, status_token
+from occupancy_smoother import OccupancySmoother
+from occupancy_log import OccupancyLog
+from shared_state import StatusWriter, check_summary_fits
+from availability import Availability
+from slot_finder import SlotFinder
+
+# New on every start: versions restart at 0, so tokens carry this too (status_codec.status_token)
+BOOT_EPOCH = os.urandom(4).hex()
+
+# Registry format (registry.json):
+# {
+#     "lots": {
+#         "st_thomas_main": {"config": "config.json", "map_image": "st_thomas_top_down.png"}
+#     },
+#     "cameras": {
+#         "cam_0": {"lot_id": "st_thomas_main", "matrix": "matrix.npy",
+#                   "edge_url": "http://localhost:5000/detections", "frame_size": [854, 480]}
+#     }
+# }
+# "edge_url" is optional: cameras without one only get pushed detections.
+# "frame_size" is optional: the camera's resolution, needed for a slot raster.
+
+
+def load_matrix(matrix_file):
+    """Loads a camera's homography, falling back to identity so one bad camera can't crash the lot."""
+    try:
+        return np.load(matrix_file)
+    except Exception:
+        print(f"CRITICAL ERROR: Matrix file '{matrix_file}' not found. Run calibration first.")
+        return np.eye(3) # Fallback to prevent crash
+
+
+class Camera:
+    """One edge camera: its own homography, the lot it looks at, and its latest points."""
+
+    def __init__(self, camera_id, lot_id, h_matrix, edge_url=None, frame_size=None, matrix_file=None):
+        self.camera_id = camera_id
+        self.lot_id = lot_id
+        self.h_matrix = h_matrix
+        self.edge_url = edge_url
+        # Where h_matrix came from, so a recalibration can be reloaded live
+        self.matrix_file = matrix_file
+        # (width, height) of the camera image the matrix was calibrated on, if known
+        self.frame_size = frame_size
+        # The lot's slot index (set by Registry.add_camera) and the optional
+        # precomputed pixel -> slot table (see enable_raster)
+        self.slot_grid = None
+        self.raster = None
+        self.raster_options = None  # (scale, cache_dir) once enable_raster was called
+        self.footprint_options = None  # (ground_share, threshold) once enable_footprints was called
+        # Latest detections of this camera: [x, y, w, h] boxes and centre points
+        # (camera pixels), the slot each one is in, and every slot they occupy
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.points = np.zeros((0, 2), dtype=np.float32)
+        self.slot_indices = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.updated_at = 0.0
+        # How long the last classify() spent projecting to the map vs matching
+        # slots (seconds), for the backend's /metrics
+        self.transform_seconds = 0.0
+        self.match_seconds = 0.0
+
+    def enable_raster(self, slot_rects, scale=1.0, cache_dir=None):
+        """Classify detections with a SlotRaster lookup instead of transform + search."""
+        if self.frame_size is None:
+            raise ValueError(f"Camera '{self.camera_id}' needs a frame_size for a slot raster")
+        self.raster_options = (scale, cache_dir)
+        self.raster = self.build_raster(self.h_matrix, slot_rects)
+
+    def build_raster(self, h_matrix, slot_rects):
+        """A SlotRaster for the given matrix/slots with this camera's settings, or None if rasters are off."""
+        if self.raster_options is None:
+            return None
+        scale, cache_dir = self.raster_options
+        return SlotRaster.load_or_build(h_matrix, slot_rects, self.frame_size, scale, cache_dir)
+
+    def enable_footprints(self, ground_share=0.3, threshold=0.3):
+        """
+        Detections that come with a box size occupy every slot their ground
+        footprint (bottom ground_share of the box, projected to the map)
+        covers at least `threshold` of. See footprint.py.
+        """
+        self.footprint_options = (ground_share, threshold)
+
+    @property
+    def map_points(self):
+        """The latest detections in map pixels (only computed when asked for, e.g. by the debug view)."""
+        return transform_points(self.points, self.h_matrix)
+
+    def _to_map(self, points):
+        """transform_points with THIS camera's matrix, timed into transform_seconds."""
+        started = time.perf_counter()
+        map_points = transform_points(points, self.h_matrix)
+        self.transform_seconds += time.perf_counter() - started
+        return map_points
+
+    def match(self, points):
+        """Slot index of every camera-pixel point, -1 for none."""
+        if self.raster is None:
+            # Camera pixels -> map pixels with THIS camera's matrix (one cv2 call) -> grid search
+            return self.slot_grid.match(self._to_map(points))
+        slot_indices, outside = self.raster.lookup(points)
+        if outside.any():
+            # Off the raster (bigger frame than calibrated?): the slow path, for those only
+            slot_indices[outside] = self.slot_grid.match(self._to_map(points[outside]))
+        return slot_indices
+
+    def classify(self):
+        """Works out slot_indices and hits for the current boxes (again, after a reload)."""
+        started = time.perf_counter()
+        self.transform_seconds = 0.0
+        self._classify()
+        # Everything that wasn't projecting points or quads was matching
+        self.match_seconds = time.perf_counter() - started - self.transform_seconds
+
+    def _classify(self):
+        self.slot_indices = self.match(self.points)
+        self.hits = self.slot_indices
+        if self.footprint_options is None:
+            return
+
+        sized = (self.boxes[:, 2] > 0) & (self.boxes[:, 3] > 0)  # NaN = just a point
+        if not sized.any():
+            return
+        ground_share, threshold = self.footprint_options
+        started = time.perf_counter()
+        map_quads = project_quads(footprint_quads(self.boxes[sized], ground_share), self.h_matrix)
+        self.transform_seconds += time.perf_counter() - started
+        covered, best = footprint_hits(map_quads, self.slot_grid, threshold)
+        # A box whose footprint covers no slot enough keeps its centre-point match
+        # (e.g. half out of frame), so footprints never lose a car the point saw
+        fallback = self.slot_indices[sized]
+        self.slot_indices = self.slot_indices.copy()
+        self.slot_indices[sized] = np.where(best >= 0, best, fallback)
+        self.hits = np.concatenate([self.slot_indices[~sized], covered, fallback[best < 0]])
+
+    def set_detections(self, raw_detections, timestamp):
+        self.boxes = detections_to_boxes(raw_detections)
+        self.points = np.ascontiguousarray(self.boxes[:, :2])
+        self.classify()
+        self.updated_at = timestamp
+
+
+def view_map_points(views):
+    """Map points of a Lot.latest_view's (camera points, matrix) pairs, in match order."""
+    return np.concatenate([transform_points(points, h_matrix) for points, h_matrix in views] or
+                          [np.zeros((0, 2), dtype=np.float32)])
+
+
+class Lot:
+    """
+    One parking lot: its slot config, the slot index built from it, and the live
+    status string merged from every camera that looks at it.
+    """
+
+    # How many past versions are kept for delta responses
+    HISTORY_LENGTH = 64
+
+    def __init__(self, lot_id, config, map_image=None, config_file=None):
+        self.lot_id = lot_id
+        self.config = config
+        self.map_image = map_image
+        # Where config came from, so slot edits can be reloaded live
+        self.config_file = config_file
+        self.cameras = []
+        # ETag of the config, so /api/config can answer 304 Not Modified
+        self.config_etag = config_etag(config)
+
+        # Slot rectangles as one NumPy array + a grid index over them, built ONCE
+        self.slot_rects = build_slot_rects(config)
+        self.slot_grid = SlotGrid(self.slot_rects)
+        # KD-trees over the slot centres for nearest-free-slot queries
+        self.slot_finder = SlotFinder(config)
+        self._base_map = None
+
+        # LIVE STATE (The String)
+        # We initialize it with all '0's based on number of slots
+        self.status_string = "0" * len(config['slots'])
+        # Goes up by one every time status_string actually changes
+        self.version = 0
+        self.epoch = BOOT_EPOCH
+        # Server-side counts, so clients don't have to scan the string
+        self.counts = count_status(self.status_string)
+        # Free/occupied per slot type and zone, moved along with each change
+        self.availability = Availability(config)
+        # Recent (version, status_string, counts, availability summary), newest
+        # last: ONE tuple per update, so readers never mix two versions, and
+        # "what changed since version N" for deltas
+        self.history = deque([(0, self.status_string, self.counts, self.availability.summary())],
+                             maxlen=self.HISTORY_LENGTH)
+        # Last update's points, kept so the debug view can be drawn on demand:
+        # (tick number, [(camera points, camera matrix), ...], matched slot indices).
+        # Map points are only worked out when someone draws it (view_map_points)
+        self.latest_view = (0, [], np.zeros(0, dtype=np.int64))
+
+        # Optional debouncing of the raw per-update occupancy (see enable_smoothing)
+        self.smoother = None
+        # Optional on-disk log of every slot transition (see enable_history)
+        self.history_log = None
+        # Optional copy of the live status for API worker processes (see enable_shared_state)
+        self.shared = None
+
+        # Pushes (API threads) and the polling workers can both update the lot
+        self.lock = Lock()
+
+    def enable_smoothing(self, window, on_votes, off_votes):
+        """Publish the majority/hysteresis vote of the last `window` updates instead of the raw match."""
+        self.smoother = OccupancySmoother(len(self.slot_rects), window, on_votes, off_votes)
+
+    def enable_history(self, log_file):
+        """Append every slot transition of this lot to an OccupancyLog at log_file."""
+        self.history_log = OccupancyLog(log_file)
+        self.history_log.open_session()
+
+    def enable_shared_state(self, state_dir):
+        """Mirror the config and every published status into state_dir for API workers (shared_state.py)."""
+        check_summary_fits(len(self.slot_rects), self.counts, self.latest()[3])
+        self.shared = StatusWriter(state_dir, self.lot_id, len(self.slot_rects), self.HISTORY_LENGTH, self.epoch)
+        self.shared.publish_config(self.config, self.config_etag)
+        self.shared.publish(*self.latest())
+
+    @property
+    def base_map(self):
+        """Decoded map with the slot boxes drawn, built on first use and then cached."""
+        if self._base_map is None:
+            self._base_map = build_base_map(self.map_image, self.slot_rects)
+        return self._base_map
+
+    def status_etag(self, fmt="full", version=None):
+        version = self.version if version is None else version
+        suffix = "" if fmt == "full" else f"-{fmt}"
+        return f'"{self.lot_id}-{status_token(self.epoch, version)}{suffix}"'
+
+    def latest(self):
+        """(version, status_string, counts, availability summary) of the same update, safe to read from any thread."""
+        return self.history[-1]
+
+    def latest_availability(self):
+        """(version, availability summary), kept up to date on every change: no counting per call."""
+        version, _, _, availability = self.history[-1]
+        return version, availability
+
+    def changes_since(self, version, current_status):
+        """
+        [[slot_index, new_code], ...] changed between `version` and current_status,
+        or None if that version is too old (or unknown) and the client needs the full string.
+        """
+        for past_version, past_status, *_ in list(self.history):
+            if past_version == version:
+                return diff_status(past_status, current_status)
+        return None
+
+    def recompute(self):
+        """
+        Merges the matched points of ALL this lot's cameras -> Updates String.
+        Call with self.lock held. Returns True if the string changed.
+        """
+        # Each camera already matched its own detections when they arrived
+        slot_indices = np.concatenate([camera.slot_indices for camera in self.cameras] or
+                                      [np.zeros(0, dtype=np.int64)])
+        hits = np.concatenate([camera.hits for camera in self.cameras] or [np.zeros(0, dtype=np.int64)])
+        status_string = status_from_matches(hits, len(self.slot_rects))
+        if self.smoother is not None:
+            status_string = self.smoother.update(status_string)
+        views = [(camera.points, camera.h_matrix) for camera in self.cameras]
+        self.latest_view = (self.latest_view[0] + 1, views, slot_indices)
+
+        changed = status_string != self.status_string
+        if changed:
+            if self.history_log is not None:
+                self.history_log.append(time.time(), self.status_string, status_string)
+            self._publish(status_string)
+        return changed
+
+    def _publish(self, status_string):
+        old_codes = status_array(self.status_string)
+        new_codes = status_array(status_string)
+        # Only the slots that flipped move the availability counters
+        self.availability.apply(np.flatnonzero(old_codes != new_codes), old_codes, new_codes)
+        self.status_string = status_string
+        self._push_version(status_string)
+
+    def _push_version(self, status_string, restart_history=False):
+        """
+        Appends the next version's snapshot to history, and only THEN moves
+        self.version on: whoever sees the new version finds its snapshot.
+        restart_history drops the old versions (the slot count changed).
+        """
+        version = self.version + 1
+        self.counts = count_status(status_string)
+        snapshot = (version, status_string, self.counts, self.availability.summary())
+        if restart_history:
+            self.history = deque([snapshot], maxlen=self.HISTORY_LENGTH)
+        else:
+            self.history.append(snapshot)
+        self.version = version
+        if self.shared is not None:
+            self.shared.publish(*snapshot)
+
+    # --- LIVE RELOAD ---
+
+    def prepare_reload(self):
+        """
+        Re-reads config_file and every camera's matrix_file and builds the new
+        slot index and rasters, WITHOUT touching the live lot (this is the slow
+        part: run it off the lock, between ticks). Returns a plan for
+        apply_reload(), or None if nothing changed. Raises if a file can't be read.
+        """
+        config = load_config(self.config_file) if self.config_file else self.config
+        etag = config_etag(config)
+        matrices = [np.load(camera.matrix_file) if camera.matrix_file else camera.h_matrix
+                    for camera in self.cameras]
+        config_changed = etag != self.config_etag
+        matrix_changed = [not np.array_equal(h_matrix, camera.h_matrix)
+                          for camera, h_matrix in zip(self.cameras, matrices)]
+        if not config_changed and not any(matrix_changed):
+            return None
+
+        slot_rects = build_slot_rects(config) if config_changed else self.slot_rects
+        slot_grid = SlotGrid(slot_rects) if config_changed else self.slot_grid
+        slot_finder = SlotFinder(config) if config_changed else self.slot_finder
+        if config_changed and self.shared is not None:
+            # New zones/types must still fit the shared state: fail here, before anything is swapped
+            check_summary_fits(len(slot_rects), count_status("0" * len(slot_rects)),
+                               Availability(config).summary())
+        cameras = []
+        for camera, h_matrix, changed in zip(self.cameras, matrices, matrix_changed):
+            raster = camera.build_raster(h_matrix, slot_rects) if changed or config_changed else camera.raster
+            cameras.append((camera, h_matrix, raster))
+        return {"config": config, "config_etag": etag, "slot_rects": slot_rects,
+                "slot_grid": slot_grid, "slot_finder": slot_finder, "cameras": cameras,
+                "changed": (["config"] if config_changed else []) +
+                           [camera.camera_id for camera, changed in zip(self.cameras, matrix_changed) if changed]}
+
+    def apply_reload(self, plan):
+        """
+        Swaps in what prepare_reload() built and re-matches every camera's last
+        points against it. Call with self.lock held (so it lands between two
+        ticks). Returns True if the status string changed.
+        """
+        old_status = self.status_string
+        resized = len(plan["slot_rects"]) != len(self.slot_rects)
+
+        self.config = plan["config"]
+        self.config_etag = plan["config_etag"]
+        self.slot_rects = plan["slot_rects"]
+        self.slot_grid = plan["slot_grid"]
+        self.slot_finder = plan["slot_finder"]
+        self._base_map = None  # Redrawn with the new slots on next use
+        for camera, h_matrix, raster in plan["cameras"]:
+            camera.h_matrix = h_matrix
+            camera.raster = raster
+            camera.slot_grid = self.slot_grid
+            camera.classify()
+
+        if resized:
+            # Slot numbers mean something else now: close every old slot in the
+            # history log, restart smoothing and deltas from an all-free lot
+            if self.history_log is not None:
+                self.history_log.append(time.time(), old_status, "0" * len(old_status))
+            if self.smoother is not None:
+                self.smoother = OccupancySmoother(len(self.slot_rects), self.smoother.window,
+                                                  self.smoother.on_votes, self.smoother.off_votes)
+            self.status_string = "0" * len(self.slot_rects)
+        if "config" in plan["changed"]:
+            # Slot types/zones may have changed: count them once from the new config
+            self.availability = Availability(self.config, self.status_string)
+        if resized and self.shared is not None:
+            self.shared.resize(len(self.slot_rects))
+        if resized or "config" in plan["changed"]:
+            # A new version carries the new counts. Old versions can't be diffed
+            # against a new length: then the history is replaced in one go
+            self._push_version(self.status_string, restart_history=resized)
+        if self.shared is not None and "config" in plan["changed"]:
+            self.shared.publish_config(self.config, self.config_etag)
+        return self.recompute() or resized
+
+
+def config_etag(config):
+    return '"' + hashlib.md5(json.dumps(config, sort_keys=True).encode()).hexdigest() + '"'
+
+
+class Registry:
+    """Maps camera IDs -> cameras (with their homography) and lot IDs -> lots."""
+
+    def __init__(self):
+        self.lots = {}
+        self.cameras = {}
+
+    @property
+    def default_lot(self):
+        """The first lot, served by the old single-lot /api/config and /api/status."""
+        return next(iter(self.lots.values()))
+
+    def add_lot(self, lot):
+        self.lots[lot.lot_id] = lot
+
+    def add_camera(self, camera):
+        if camera.lot_id not in self.lots:
+            raise ValueError(f"Camera '{camera.camera_id}' points at unknown lot '{camera.lot_id}'")
+        self.cameras[camera.camera_id] = camera
+        lot = self.lots[camera.lot_id]
+        lot.cameras.append(camera)
+        camera.slot_grid = lot.slot_grid
+
+
+def load_config(config_file):
+    with open(config_file, 'r') as f:
+        return json.load(f)
+
+
+def load_registry(registry_file):
+    """Builds the registry from registry.json (paths are relative to that file)."""
+    with open(registry_file, 'r') as f:
+        spec = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(registry_file))
+
+    registry = Registry()
+    for lot_id, lot_spec in spec['lots'].items():
+        config = load_config(os.path.join(base_dir, lot_spec['config']))
+        map_image = lot_spec.get('map_image')
+        if map_image:
+            map_image = os.path.join(base_dir, map_image)
+        registry.add_lot(Lot(lot_id, config, map_image, os.path.join(base_dir, lot_spec['config'])))
+
+    for camera_id, camera_spec in spec['cameras'].items():
+        matrix_file = os.path.join(base_dir, camera_spec['matrix'])
+        frame_size = camera_spec.get('frame_size')
+        registry.add_camera(Camera(camera_id, camera_spec['lot_id'], load_matrix(matrix_file),
+                                   camera_spec.get('edge_url'), tuple(frame_size) if frame_size else None,
+                                   matrix_file))
+    return registry
+
+
+def single_lot_registry(config_file, matrix_file, map_image, edge_urls, frame_size=None):
+    """
+    The classic setup: one config.json + one matrix.npy. Every edge URL
+    becomes a camera (cam_0, cam_1, ...) of that one lot.
+    """
+    config = load_config(config_file)
+    registry = Registry()
+    lot = Lot(config['lot_id'], config, map_image, config_file)
+    registry.add_lot(lot)
+
+    h_matrix = load_matrix(matrix_file)
+    for index, edge_url in enumerate(edge_urls or [None]):
+        registry.add_camera(Camera(f"cam_{index}", lot.lot_id, h_matrix, edge_url, frame_size, matrix_file))
+    return registry
@@ -0,0 +1,75 @@
+import os
+import time
+
+import cv2
+
+from lot_registry import load_registry, single_lot_registry
+
+# Everything that decides how detections become slot states, in ONE place:
+# backend_brain.py (live), replay.py (in-process replays) and benchmark.py all
+# set up their lots from here, so a replay gives the same status strings (and
+# digest) as the live backend, and the benchmark times what production runs.
+
+# --- CONFIGURATION ---
+# Multi-lot / multi-camera setup. If this file is missing, the single-lot
+# settings below are used (one lot from SLOTS_CONFIG_FILE, one camera per edge URL).
+REGISTRY_FILE = "registry.json"
+MATRIX_FILE = "matrix.npy"
+SLOTS_CONFIG_FILE = "./config.json"
+MAP_IMAGE_FILE = "st_thomas_top_down.png"
+CAMERA_IMAGE_FILE = "camera_view.png" # The calibration screenshot: its size is the camera resolution
+
+# Occupancy smoothing: a slot only flips after enough of its last N updates agree.
+# Counts updates, so use it with edges that send at a steady rate. 1 = off.
+SMOOTHING_WINDOW = 1
+SMOOTHING_ON_VOTES = 3  # Free -> occupied once this many of the window saw a car
+SMOOTHING_OFF_VOTES = 1 # Occupied -> free once at most this many saw a car
+
+# Camera pixel -> slot lookup table per camera, built once (and cached on disk)
+# so a detection is classified with one array index. Needs each camera's
+# resolution: "frame_size" in registry.json, or CAMERA_IMAGE_FILE's size.
+SLOT_RASTER_SCALE = 1.0 # 1.0 = one cell per pixel, 0.5 = a quarter of the memory, None = off
+SLOT_RASTER_CACHE_DIR = "cache"
+
+# Detections with a box size (model/app.py sends w/h) can occupy every slot their
+# ground footprint covers enough of, so a bus across two slots fills both.
+# OFF by default: it clips every footprint against every slot it touches, ~100x
+# the match time of the raster/point path (benchmark.py, 10k slots: ~120 ms vs
+# ~1 ms per tick). Turn it on for lots with buses/trucks that can afford it.
+FOOTPRINT_OVERLAP = None     # Share of a slot's area the footprint must cover, e.g. 0.3 (None = centre point only)
+FOOTPRINT_GROUND_SHARE = 0.3 # Bottom share of the camera box that touches the ground
+# ---------------------
+
+
+def camera_frame_size(camera_image_file=CAMERA_IMAGE_FILE):
+    """(width, height) of the calibration screenshot, or None if there isn't one."""
+    camera_image = cv2.imread(camera_image_file) if os.path.exists(camera_image_file) else None
+    return (camera_image.shape[1], camera_image.shape[0]) if camera_image is not None else None
+
+
+def load_lots(edge_urls=None, map_image=MAP_IMAGE_FILE):
+    """registry.json if there is one, else the single lot from config.json + matrix.npy."""
+    if os.path.exists(REGISTRY_FILE):
+        return load_registry(REGISTRY_FILE)
+    return single_lot_registry(SLOTS_CONFIG_FILE, MATRIX_FILE, map_image, edge_urls, camera_frame_size())
+
+
+def apply_matching_settings(registry, raster_cache_dir=SLOT_RASTER_CACHE_DIR):
+    """Slot rasters, footprints and smoothing on every camera/lot, per the settings above."""
+    if SLOT_RASTER_SCALE:
+        for camera in registry.cameras.values():
+            if camera.frame_size is None:
+                print(f"No frame size for camera {camera.camera_id}: no slot raster, using transform + search")
+                continue
+            started = time.perf_counter()
+            camera.enable_raster(registry.lots[camera.lot_id].slot_rects, SLOT_RASTER_SCALE, raster_cache_dir)
+            print(f"Slot raster for {camera.camera_id}: {camera.raster.width}x{camera.raster.height} "
+                  f"in {time.perf_counter() - started:.2f}s")
+
+    if FOOTPRINT_OVERLAP:
+        for camera in registry.cameras.values():
+            camera.enable_footprints(FOOTPRINT_GROUND_SHARE, FOOTPRINT_OVERLAP)
+
+    if SMOOTHING_WINDOW > 1:
+        for lot in registry.lots.values():
+            lot.enable_smoothing(SMOOTHING_WINDOW, SMOOTHING_ON_VOTES, SMOOTHING_OFF_VOTES)
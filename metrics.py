@@ -0,0 +1,29 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Backend metrics, served as Prometheus text on GET /metrics.
+# Each observation is a few hundred nanoseconds, so they stay on in the hot loop.
+
+# Sub-millisecond buckets: matching a whole lot is usually well under 1 ms
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Network and whole-tick buckets
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FETCH_SECONDS = Histogram("parking_edge_fetch_seconds", "Time to GET one camera's detections",
+                          ["camera"], buckets=SLOW_BUCKETS)
+FETCH_ERRORS = Counter("parking_edge_fetch_errors_total", "Failed or timed out edge fetches", ["camera"])
+TRANSFORM_SECONDS = Histogram("parking_transform_seconds",
+                              "Camera -> map projection of one camera's detections", buckets=FAST_BUCKETS)
+MATCH_SECONDS = Histogram("parking_match_seconds",
+                          "Slot matching of one camera's detections (grid, raster or footprints)",
+                          buckets=FAST_BUCKETS)
+RENDER_SECONDS = Histogram("parking_render_seconds", "Drawing one debug view frame", buckets=SLOW_BUCKETS)
+UPDATE_SECONDS = Histogram("parking_update_seconds",
+                           "One lot update: classify the new detections + recompute the status string",
+                           buckets=FAST_BUCKETS)
+POLL_TICK_SECONDS = Histogram("parking_poll_tick_seconds",
+                              "One polling tick: fetch every edge + update every lot", buckets=SLOW_BUCKETS)
+
+DETECTIONS = Counter("parking_detections_total", "Detections received", ["camera"])
+UNMATCHED_DETECTIONS = Counter("parking_unmatched_detections_total", "Detections that landed in no slot", ["camera"])
+STATUS_CHANGES = Counter("parking_status_changes_total", "Times a lot's status string changed", ["lot"])
+OCCUPIED_SLOTS = Gauge("parking_occupied_slots", "Occupied slots right now", ["lot"])
@@ -4,6 +4,24 @@ from ultralytics import YOLO
 import requests
 import pandas as pd
 import tempfile
+import json
+import time
+import uuid
+import os
+import sys
+
+# loop_profiler.py lives in the repo root (shared with backend_brain.py):
+# put it on the path ONCE here, before anything imports it
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loop_profiler import make_profiler
+from edge_pipeline import EdgePipeline, YoloDetector
+from roi import RoiDetector, load_slot_polygons
+from motion_gate import MotionGatedDetector
+
+try:
+    import msgpack  # Optional: smaller, faster batches (pip install msgpack)
+except ImportError:
+    msgpack = None
 
 st.set_page_config(page_title="Smart Parking AI", layout="wide")
 st.title("🅿️ Vehicle Detection & JSON Bridge")
@@ -11,7 +29,49 @@ st.title("🅿️ Vehicle Detection & JSON Bridge")
 # Sidebar for AI and API configuration
 st.sidebar.header("Settings")
 conf_level = st.sidebar.slider("Confidence", 0.0, 1.0, 0.25)
-api_url = st.sidebar.text_input("Server URL", "http://127.0.0.1:8000/update_data")
+api_url = st.sidebar.text_input("Server URL", "http://127.0.0.1:8000/ingest")
+batch_frames = st.sidebar.slider("Frames per batch", 1, 30, 1,
+                                 help="The server only keeps the newest frame, so >1 just adds latency. "
+                                      "Larger values only help throughput on GPU-bound setups (fewer POSTs)")
+wire_format = st.sidebar.selectbox("Wire format", ["json", "msgpack"] if msgpack else ["json"])
+push_url = st.sidebar.text_input("Backend Push URL (optional)", "", help="e.g. http://127.0.0.1:8000/api/detections on backend_brain")
+use_roi = st.sidebar.toggle("Only detect inside parking slots (ROI)", value=False,
+                            help="Runs YOLO on crops around the config.json slots instead of the whole frame")
+use_motion_gate = st.sidebar.toggle("Skip detection while slots are still (motion gate)", value=False,
+                                    help="Only runs YOLO when pixels inside some slot change; reuses the last detections otherwise")
+profile_mode = st.sidebar.selectbox("Profile the frame loop", ["off", "spans", "stacks"],
+                                    help="spans: Chrome trace of decode/detect/publish; stacks: sampled call stacks "
+                                         "(flamegraph). Written to ./profiles")
+profile_every = st.sidebar.number_input("Profile one frame out of", 1, 10000, 50)
+roi_config_file = st.sidebar.text_input("Slots config", "../config.json")
+roi_matrix_file = st.sidebar.text_input("Camera matrix", "../matrix.npy")
+
+# Pooled connections (no new TCP handshake per request)
+bridge_session = requests.Session()
+push_session = requests.Session()
+
+def send_batch(stream_id, frames):
+    """POSTs a batch of frames to model/server.py's /ingest (see parse_batch there)."""
+    batch = {"stream": stream_id, "frames": frames}
+    if wire_format == "msgpack":
+        body, content_type = msgpack.packb(batch), "application/msgpack"
+    else:
+        body, content_type = json.dumps(batch), "application/json"
+    try:
+        bridge_session.post(api_url, data=body, headers={"Content-Type": content_type}, timeout=0.5)
+    except requests.RequestException as e:
+        print(f"Bridge push failed ({len(frames)} frames dropped): {e}")
+
+def publish(frames):
+    """Runs on the pipeline's publish thread, so HTTP never holds up inference."""
+    send_batch(stream_id, frames)
+
+    # --- PUSH STRAIGHT TO THE BACKEND (optional) ---
+    if push_url:
+        try:
+            push_session.post(push_url, json=frames[-1]["detections"], timeout=0.5)
+        except requests.RequestException:
+            pass
 
 # Initialize YOLO
 model = YOLO("yolov8n.pt")
@@ -21,35 +81,38 @@ if uploaded_video:
     tfile = tempfile.NamedTemporaryFile(delete=False)
     tfile.write(uploaded_video.read())
     cap = cv2.VideoCapture(tfile.name)
-    
-    st_frame = st.empty()
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        
-        # --- VIDEO LOOPING LOGIC ---
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0) # Reset to start
-            ret, frame = cap.read()
-            if not ret: break
-
-        # Run AI (Classes 2,3,5,7 = Car, Motorcycle, Bus, Truck)
-        results = model.predict(frame, conf=conf_level, imgsz=1280, classes=[2,3,5,7], verbose=False)
-        
-        current_frame_data = []
-        for box in results[0].boxes:
-            x, y, _, _ = box.xywh[0].tolist()
-            label = model.names[int(box.cls[0])]
-            current_frame_data.append({ "x": round(x, 1), "y": round(y, 1),"type": label,})
-
-        # --- UPDATE THE BRIDGE ---
-        try:
-            # We "push" the data to the FastAPI server
-            requests.get(api_url, params={"data": str(current_frame_data)}, timeout=0.01)
-        except:
-            pass
+    st_frame = st.empty()
+    st_stats = st.sidebar.empty()
+    stream_id = uuid.uuid4().hex  # seq numbers restart with every run
 
-        # Display Live Feed
-        st_frame.image(results[0].plot(), channels="BGR", use_container_width=True)
+    # Decode -> YOLO -> Publish run on their own threads; old frames are dropped
+    # when YOLO falls behind the video
+    detector = YoloDetector(model, conf=conf_level, imgsz=1280)
+    if use_roi or use_motion_gate:
+        # Slots projected into this camera with the inverse homography, once per calibration
+        polygons = load_slot_polygons(roi_config_file, roi_matrix_file)
+    if use_roi:
+        detector = RoiDetector(YoloDetector(model, conf=conf_level, imgsz=None), polygons)
+    if use_motion_gate:
+        detector = MotionGatedDetector(detector, polygons)
+    profiler = make_profiler("edge", None if profile_mode == "off" else profile_mode, profile_every,
+                             threads=("edge-",))
+    pipeline = EdgePipeline(cap, detector, publish, batch_frames=batch_frames, profiler=profiler).start()
 
-    cap.release()
\ No newline at end of file
+    # This loop only shows the newest result
+    try:
+        shown_seq = None
+        while pipeline.running:
+            latest = pipeline.latest
+            if latest is not None and latest[0] != shown_seq:
+                shown_seq, annotated, _ = latest
+                # Display Live Feed
+                st_frame.image(annotated, channels="BGR", use_container_width=True)
+                st_stats.write({**pipeline.stats, **getattr(detector, "stats", {})})
+            time.sleep(0.03)
+    finally:
+        # Streamlit stops this script on every rerun; don't leave the threads behind
+        pipeline.stop()
+        cap.release()
+        profiler.close()
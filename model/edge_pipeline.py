@@ -0,0 +1,210 @@
+import queue
+import time
+from threading import Event, Thread
+
+import cv2
+
+from loop_profiler import DISABLED  # Repo root: the entry point (app.py) puts it on the path
+
+# Classes 2,3,5,7 = Car, Motorcycle, Bus, Truck (COCO)
+VEHICLE_CLASSES = [2, 3, 5, 7]
+
+
+def put_latest(q, item):
+    """
+    Puts item on a bounded queue, dropping the OLDEST entries if it is full,
+    so a slow consumer always gets the freshest data. Returns how many were dropped.
+    """
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+# --- DETECTORS ---
+# Anything with detect(frame) -> (detections, annotated_frame_or_None) plugs into the pipeline.
+# detections format: [{"x": 200.5, "y": 450.0, "w": 80.0, "h": 60.0, "type": "car"}, ...]
+# (camera pixels; x/y = box centre, w/h = box size, optional)
+
+class Detector:
+    def detect(self, frame):
+        raise NotImplementedError
+
+
+class YoloDetector(Detector):
+    """
+    Ultralytics YOLO on the whole frame (the original model/app.py behaviour).
+    imgsz=None runs each image at its own size (rounded up to a multiple of 32),
+    which is what you want for small crops.
+    """
+
+    def __init__(self, model, conf=0.25, imgsz=1280, classes=VEHICLE_CLASSES, annotate=True):
+        self.model = model
+        self.conf = conf
+        self.imgsz = imgsz
+        self.classes = classes
+        self.annotate = annotate
+
+    def detect(self, frame):
+        imgsz = self.imgsz or -(-max(frame.shape[:2]) // 32) * 32
+        results = self.model.predict(frame, conf=self.conf, imgsz=imgsz, classes=self.classes, verbose=False)
+        detections = []
+        for box in results[0].boxes:
+            x, y, w, h = box.xywh[0].tolist()
+            label = self.model.names[int(box.cls[0])]
+            # The backend projects the bottom of the box onto the map (footprint matching)
+            detections.append({"x": round(x, 1), "y": round(y, 1), "w": round(w, 1), "h": round(h, 1),
+                               "type": label})
+        return detections, (results[0].plot() if self.annotate else None)
+
+
+class StubDetector(Detector):
+    """Returns fixed detections after an optional delay. For tests and CPU-only dry runs."""
+
+    def __init__(self, detections=None, delay=0.0):
+        self.detections = detections or []
+        self.delay = delay
+
+    def detect(self, frame):
+        if self.delay:
+            time.sleep(self.delay)
+        return [dict(det) for det in self.detections], None
+
+
+# --- PIPELINE ---
+
+class EdgePipeline:
+    """
+    Decode -> Inference -> Publish, each on its own thread, joined by small
+    bounded queues. When the detector falls behind, the oldest waiting frames
+    are dropped, so it always works on the newest frame and latency stays
+    bounded. Publishing (HTTP) never blocks inference.
+
+    publish(frames) is called with a list of
+    {"seq": 17, "timestamp": 1700000000.12, "detections": [...]}, oldest first,
+    at most batch_frames long.
+
+    profiler: anything with tick() / span(name) (see loop_profiler.py); one
+    inference iteration = one tick, decode and publish spans are included.
+    """
+
+    def __init__(self, capture, detector, publish, queue_size=2, batch_frames=1,
+                 loop_video=True, realtime=True, profiler=None):
+        self.capture = capture
+        self.detector = detector
+        self.publish = publish
+        self.batch_frames = batch_frames
+        self.loop_video = loop_video
+        self.realtime = realtime
+        self.profiler = profiler or DISABLED
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.result_queue = queue.Queue(maxsize=max(queue_size, batch_frames) * 4)
+        self.stop_event = Event()
+        self.threads = []
+
+        # Newest (seq, annotated frame or raw frame, detections) for the UI
+        self.latest = None
+        self.stats = {"read": 0, "dropped": 0, "inferred": 0, "published": 0, "publish_dropped": 0}
+
+    def start(self):
+        for target, name in ((self._decode_loop, "decode"), (self._inference_loop, "inference"),
+                             (self._publish_loop, "publish")):
+            thread = Thread(target=target, name=f"edge-{name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def _decode_loop(self):
+        # Video files are paced at their own FPS, like a live camera would be
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 0
+        frame_interval = 1.0 / fps if self.realtime and fps > 0 else 0.0
+        seq = 0
+        next_frame_at = time.monotonic()
+
+        while not self.stop_event.is_set():
+            with self.profiler.span("decode"):
+                ret, frame = self.capture.read()
+                # --- VIDEO LOOPING LOGIC ---
+                if not ret and self.loop_video:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0) # Reset to start
+                    ret, frame = self.capture.read()
+            if not ret:
+                break
+
+            seq += 1
+            self.stats["read"] += 1
+            self.stats["dropped"] += put_latest(self.frame_queue, (seq, time.time(), frame))
+
+            if frame_interval:
+                next_frame_at += frame_interval
+                delay = next_frame_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_at = time.monotonic()
+        # Tell the next stage there is nothing more coming (may push out a waiting frame too)
+        self.stats["dropped"] += put_latest(self.frame_queue, None)
+
+    def _inference_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                item = self.frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+
+            seq, timestamp, frame = item
+            self.profiler.tick()
+            try:
+                with self.profiler.span("detect"):
+                    detections, annotated = self.detector.detect(frame)
+            except Exception as e:
+                print(f"Detector failed on frame {seq}: {e}")
+                continue
+            self.stats["inferred"] += 1
+            self.latest = (seq, annotated if annotated is not None else frame, detections)
+            self.stats["publish_dropped"] += put_latest(
+                self.result_queue, {"seq": seq, "timestamp": timestamp, "detections": detections})
+        self.stats["publish_dropped"] += put_latest(self.result_queue, None)
+
+    def _publish_loop(self):
+        pending = []
+        finished = False
+        while not finished and not self.stop_event.is_set():
+            try:
+                item = self.result_queue.get(timeout=0.1)
+            except queue.Empty:
+                item = False  # Nothing new: flush what we have
+
+            if item is None:
+                finished = True
+            elif item:
+                pending.append(item)
+                if len(pending) < self.batch_frames:
+                    continue
+            if pending:
+                try:
+                    with self.profiler.span("publish"):
+                        self.publish(pending)
+                    self.stats["published"] += len(pending)
+                except Exception as e:
+                    print(f"Publish failed ({len(pending)} frames dropped): {e}")
+                pending = []
@@ -0,0 +1,108 @@
+import time
+
+import cv2
+import numpy as np
+
+from edge_pipeline import Detector
+
+
+def slot_label_image(polygons, frame_width, frame_height, scale=1.0):
+    """
+    Rasterizes the camera-space slot quads (see roi.slot_polygons_in_camera)
+    into an int32 image of `scale` x the frame size: each pixel holds the index
+    of the slot it belongs to, or -1. Where two slots overlap the later one wins.
+    """
+    width = max(int(round(frame_width * scale)), 1)
+    height = max(int(round(frame_height * scale)), 1)
+    labels = np.full((height, width), -1, dtype=np.int32)
+    for index, quad in enumerate(polygons):
+        cv2.fillConvexPoly(labels, np.round(quad * scale).astype(np.int32), int(index))
+    return labels
+
+
+class MotionGatedDetector(Detector):
+    """
+    Cars in a lot sit still most of the time, so there is no point running
+    YOLO on every frame. This wraps any detector and keeps a small grayscale
+    copy of the frame it last ran on. Each new frame is diffed against it,
+    slot by slot; the inner detector only runs when some slot has changed,
+    otherwise the cached detections are returned.
+
+    - pixel_threshold: grey-level difference that counts a pixel as changed
+    - min_changed: share of a slot's pixels that must change to wake the detector
+    - max_age: seconds after which the detector runs anyway (slow light changes,
+      anything the diff missed)
+    - scale: the diff runs on a frame shrunk by this factor (it's only a trigger)
+    """
+
+    def __init__(self, detector, polygons, pixel_threshold=25, min_changed=0.05,
+                 max_age=10.0, scale=0.25):
+        self.detector = detector
+        self.polygons = polygons
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.max_age = max_age
+        self.scale = scale
+
+        self.frame_size = None
+        self.labels = None
+        self.slot_area = None
+        self.reference = None
+        self.cached = None
+        self.detected_at = 0.0
+        self.stats = {"detected": 0, "skipped": 0}
+
+    def prepare(self, frame_width, frame_height):
+        self.frame_size = (frame_width, frame_height)
+        self.labels = slot_label_image(self.polygons, frame_width, frame_height, self.scale)
+        inside = self.labels >= 0
+        self.slot_area = np.bincount(self.labels[inside], minlength=len(self.polygons))
+        self.reference = None
+        print(f"Motion gate: watching {int((self.slot_area > 0).sum())}/{len(self.polygons)} slots "
+              f"on a {self.labels.shape[1]}x{self.labels.shape[0]} grid")
+
+    def _small_gray(self, frame):
+        height, width = self.labels.shape
+        small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur away sensor noise and compression artifacts before diffing
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def changed_slots(self, gray):
+        """Indices of the slots whose pixels moved since the reference frame."""
+        changed = cv2.absdiff(gray, self.reference) > self.pixel_threshold
+        changed &= self.labels >= 0
+        changed_pixels = np.bincount(self.labels[changed], minlength=len(self.slot_area))
+        share = np.divide(changed_pixels, self.slot_area,
+                          out=np.zeros(len(self.slot_area)), where=self.slot_area > 0)
+        return np.flatnonzero(share >= self.min_changed)
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        if self.frame_size != (width, height):
+            self.prepare(width, height)
+
+        gray = self._small_gray(frame)
+        now = time.monotonic()
+        if (self.reference is not None and self.cached is not None
+                and now - self.detected_at < self.max_age
+                and len(self.changed_slots(gray)) == 0):
+            # Nothing moved in any slot: reuse the last detections
+            self.stats["skipped"] += 1
+            return [dict(det) for det in self.cached], self._annotate_cached(frame)
+
+        detections, annotated = self.detector.detect(frame)
+        # The diff is always against the frame the cached detections came from,
+        # so a slow creep still adds up to a change
+        self.reference = gray
+        self.cached = [dict(det) for det in detections]
+        self.detected_at = now
+        self.stats["detected"] += 1
+        return detections, annotated
+
+    def _annotate_cached(self, frame):
+        annotated = frame.copy()
+        for det in self.cached:
+            cv2.circle(annotated, (int(det["x"]), int(det["y"])), 6, (0, 200, 255), -1)
+        return annotated
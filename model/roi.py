@@ -0,0 +1,108 @@
+import json
+
+import cv2
+import numpy as np
+
+from edge_pipeline import Detector
+
+
+def slot_polygons_in_camera(config, h_matrix):
+    """
+    Projects every slot rectangle of config.json back into the camera view
+    with the INVERSE of matrix.npy (which maps camera -> map).
+    Returns an (N, 4, 2) float32 array of camera-space quads.
+    """
+    corners = []
+    for slot in config['slots']:
+        c = slot['coordinates']
+        corners += [(c['x'], c['y']), (c['x'] + c['w'], c['y']),
+                    (c['x'] + c['w'], c['y'] + c['h']), (c['x'], c['y'] + c['h'])]
+    if not corners:
+        return np.zeros((0, 4, 2), dtype=np.float32)
+    points = np.array(corners, dtype=np.float32).reshape(-1, 1, 2)
+    camera_points = cv2.perspectiveTransform(points, np.linalg.inv(h_matrix))
+    return camera_points.reshape(-1, 4, 2)
+
+
+def merge_boxes(boxes):
+    """Unions overlapping [x1, y1, x2, y2] boxes until none overlap. Returns an int array."""
+    boxes = [list(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while boxes:
+            box = boxes.pop()
+            for other in boxes[:]:
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    box = [min(box[0], other[0]), min(box[1], other[1]),
+                           max(box[2], other[2]), max(box[3], other[3])]
+                    boxes.remove(other)
+                    merged = True
+            result.append(box)
+        boxes = result
+    return np.array(sorted(boxes), dtype=np.int64).reshape(-1, 4)
+
+
+def build_crop_boxes(polygons, frame_width, frame_height, padding=0.5):
+    """
+    The smallest set of non-overlapping camera crops that covers every slot.
+    Each slot's bounding box is grown by `padding` x its own size on every side,
+    because a car whose centre is in the slot sticks out of it.
+    """
+    if len(polygons) == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+    mins = polygons.min(axis=1)
+    maxs = polygons.max(axis=1)
+    pad = (maxs - mins) * padding
+    boxes = np.concatenate([mins - pad, maxs + pad], axis=1)
+    boxes = np.clip(np.round(boxes), 0, [frame_width, frame_height, frame_width, frame_height])
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+    return merge_boxes(boxes.astype(np.int64))
+
+
+def load_slot_polygons(config_file, matrix_file):
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    return slot_polygons_in_camera(config, np.load(matrix_file))
+
+
+class RoiDetector(Detector):
+    """
+    Runs the inner detector only on crops around the parking slots and shifts
+    the detections back to full-frame pixels. The crops are worked out once
+    (on the first frame, when the frame size is known) per calibration.
+    Use an inner YoloDetector with imgsz=None so each crop runs at its own size.
+    """
+
+    def __init__(self, detector, polygons, padding=0.5):
+        self.detector = detector
+        self.polygons = polygons
+        self.padding = padding
+        self.crop_boxes = None
+        self.frame_size = None
+
+    def prepare(self, frame_width, frame_height):
+        self.frame_size = (frame_width, frame_height)
+        self.crop_boxes = build_crop_boxes(self.polygons, frame_width, frame_height, self.padding)
+        crop_pixels = int(((self.crop_boxes[:, 2] - self.crop_boxes[:, 0]) *
+                           (self.crop_boxes[:, 3] - self.crop_boxes[:, 1])).sum())
+        print(f"ROI: {len(self.crop_boxes)} crops cover {crop_pixels / (frame_width * frame_height):.0%} of the frame")
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        if self.frame_size != (width, height):
+            self.prepare(width, height)
+
+        detections = []
+        annotated = frame.copy()
+        for x1, y1, x2, y2 in self.crop_boxes.tolist():
+            crop_detections, crop_annotated = self.detector.detect(frame[y1:y2, x1:x2])
+            for det in crop_detections:
+                det["x"] = round(det["x"] + x1, 1)
+                det["y"] = round(det["y"] + y1, 1)
+                detections.append(det)
+            if crop_annotated is not None:
+                annotated[y1:y2, x1:x2] = crop_annotated
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), (255, 200, 0), 2)
+        return detections, annotated
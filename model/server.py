@@ -1,61 +1,135 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 import uvicorn
 import ast
+import json
+import time
+
+try:
+    import msgpack  # Optional: binary batches (pip install msgpack)
+except ImportError:
+    msgpack = None
+
+try:
+    # Optional: GET /metrics for Prometheus (pip install prometheus_client)
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+except ImportError:
+    generate_latest = None
 
 app = FastAPI()
 
-# This variable stores the state of the 'current' frame
+if generate_latest:
+    INGEST_BATCHES = Counter("edge_ingest_batches_total", "Batches POSTed to /ingest")
+    INGEST_FRAMES = Counter("edge_ingest_frames_total", "Frames received on /ingest")
+    STALE_FRAMES = Counter("edge_stale_frames_total", "Frames ignored because a newer one was already in")
+    FRAME_AGE_SECONDS = Histogram("edge_frame_age_seconds", "Capture -> ingest delay of the newest frame",
+                                  buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+# This variable stores the detections of the latest frame
 latest_frame_results = []
-from fastapi import FastAPI
-import uvicorn
-import ast
+# Sequence number and capture timestamp of that frame (None until the first batch)
+latest_frame_seq = None
+latest_frame_timestamp = None
+# Which detector run the sequence numbers belong to (they restart with each run)
+latest_stream = None
 
-app = FastAPI()
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
 
-# Shared variable to hold the latest AI results
-latest_ai_data = []
 
-@app.get("/update_data")
-def update_data(data: str):
-    """Internal: Streamlit calls this to push new coordinates."""
-    global latest_ai_data
+def parse_batch(body, content_type):
+    """
+    Decodes a POST /ingest body. Format (JSON or msgpack):
+    {"stream": "a1b2...", "frames": [{"seq": 17, "timestamp": 1700000000.12,
+                                      "detections": [{"x": 200, "y": 450, "type": "car"}, ...]}, ...]}
+    "stream" is optional: a new value means a restarted detector whose seq starts over.
+    """
+    if content_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="msgpack is not installed on this server")
+        batch = msgpack.unpackb(body, raw=False)
+    else:
+        batch = json.loads(body)
+
+    frames = batch.get("frames") if isinstance(batch, dict) else None
+    if not isinstance(frames, list):
+        raise ValueError("Batch must be an object with a 'frames' list")
+    for frame in frames:
+        if not isinstance(frame.get("seq"), int) or not isinstance(frame.get("detections"), list):
+            raise ValueError("Every frame needs an integer 'seq' and a 'detections' list")
+    return batch.get("stream"), frames
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """
+    Internal endpoint: the detector pushes batches of frames here.
+    Only the newest frame (highest seq) is kept; late or repeated frames are ignored.
+    """
+    global latest_frame_results, latest_frame_seq, latest_frame_timestamp, latest_stream
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
     try:
-        # Convert string back to Python objects safely
-        vehicle_list = ast.literal_eval(data)
-        
-        # Store it globally
-        latest_ai_data = vehicle_list
-        
-        return {"status": "success"}
+        stream, frames = parse_batch(await request.body(), content_type)
+    except HTTPException:
+        raise
     except Exception as e:
-        # If conversion fails, return the error for debugging
-        return {"status": "error", "message": str(e)}
+        raise HTTPException(status_code=400, detail=f"Bad batch: {e}")
+
+    used = 0
+    if frames:
+        newest = max(frames, key=lambda frame: frame["seq"])
+        if stream != latest_stream or latest_frame_seq is None or newest["seq"] > latest_frame_seq:
+            latest_frame_results = newest["detections"]
+            latest_frame_seq = newest["seq"]
+            latest_frame_timestamp = newest.get("timestamp")
+            latest_stream = stream
+            used = 1
+
+    if generate_latest:
+        INGEST_BATCHES.inc()
+        INGEST_FRAMES.inc(len(frames))
+        STALE_FRAMES.inc(len(frames) - used)
+        if used and isinstance(latest_frame_timestamp, (int, float)):
+            FRAME_AGE_SECONDS.observe(max(time.time() - latest_frame_timestamp, 0.0))
+
+    return {"status": "success", "frames": len(frames), "latest_seq": latest_frame_seq}
 
-@app.get("/get_coords")
-def get_coords():
-    """Public: Your friend calls this to get the JSON response."""
-    return latest_ai_data
 
-if __name__ == "__main__":
-    # Runs on port 8000
-    uvicorn.run(app, host="0.0.0.0", port=8000)
 @app.get("/update_data")
 def update_data(data: str):
-    """Internal endpoint: Streamlit calls this to push new coordinates."""
+    """Old internal endpoint (str()-ed list in the query string). Use POST /ingest instead."""
     global latest_frame_results
     try:
         # Convert string back to Python list safely
         vehicle_list = ast.literal_eval(data)
         latest_frame_results = vehicle_list
-    
+
         return {"status": "success"}
     except:
         return {"status": "error"}
 
+
 @app.get("/get_coords")
 def get_coords():
     """Public endpoint: Your friend calls this to get the JSON response."""
     return latest_frame_results
 
+
+@app.get("/get_frame")
+def get_frame():
+    """Like /get_coords, plus which frame the detections came from."""
+    return {
+        "seq": latest_frame_seq,
+        "timestamp": latest_frame_timestamp,
+        "vehicles": latest_frame_results
+    }
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint (needs prometheus_client)."""
+    if generate_latest is None:
+        raise HTTPException(status_code=501, detail="prometheus_client is not installed on this server")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
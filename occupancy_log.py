@@ -0,0 +1,267 @@
+import os
+import time
+
+import numpy as np
+
+from status_codec import status_array
+
+# One fixed-size record per slot transition (14 bytes):
+# when it happened, which slot, and its status code before/after ('0', '1', 'C', 'S', 'B')
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('slot', '<u4'), ('old', 'u1'), ('new', 'u1')])
+
+# Records are read from the memory map this many at a time, so queries over
+# months of history never pull the whole file into RAM
+CHUNK_RECORDS = 1 << 20
+
+FREE = ord('0')
+
+
+class OccupancyLog:
+    """
+    Append-only, memory-mapped log of slot state changes for one lot.
+    Writing appends raw records to the file; queries map the file read-only
+    and walk it in chunks. The log assumes every slot starts free, which holds
+    because the backend always starts from an all-'0' status (see open_session).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # A crash mid-write can leave half a record at the end: cut it off, or
+        # every record appended after it would be read shifted
+        if os.path.exists(path):
+            torn = os.path.getsize(path) % RECORD_DTYPE.itemsize
+            if torn:
+                os.truncate(path, os.path.getsize(path) - torn)
+        self._file = open(path, 'ab')
+
+    # --- WRITING ---
+
+    def append(self, timestamp, old_status, new_status):
+        """Writes one record per slot that differs between the two status strings."""
+        old_codes = status_array(old_status)
+        new_codes = status_array(new_status)
+        changed = np.flatnonzero(old_codes != new_codes)
+        if len(changed) == 0:
+            return 0
+
+        records = np.empty(len(changed), dtype=RECORD_DTYPE)
+        records['time'] = timestamp
+        records['slot'] = changed
+        records['old'] = old_codes[changed]
+        records['new'] = new_codes[changed]
+        # One write per update: readers only ever see whole records
+        self._file.write(records.tobytes())
+        self._file.flush()
+        return len(changed)
+
+    def open_session(self, timestamp=None):
+        """
+        Call once at startup. Slots the log still has as occupied (the backend
+        was stopped with cars parked) are closed with a transition to '0', since
+        the backend starts from all-free again.
+        """
+        last_codes = self.last_codes()
+        if last_codes is None or not (last_codes != FREE).any():
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        old_status = last_codes.tobytes().decode('ascii')
+        self.append(timestamp, old_status, "0" * len(old_status))
+
+    def close(self):
+        self._file.close()
+
+    # --- READING ---
+
+    def records(self):
+        """Read-only memory map of every whole record written so far."""
+        count = os.path.getsize(self.path) // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    def _chunks(self, records, lo, hi):
+        for begin in range(lo, hi, CHUNK_RECORDS):
+            yield records[begin:min(begin + CHUNK_RECORDS, hi)]
+
+    def _range(self, records, start, end):
+        """Index range of the records with start <= time < end (binary search on the map)."""
+        times = records['time']
+        return (int(np.searchsorted(times, start, side='left')),
+                int(np.searchsorted(times, end, side='left')))
+
+    @staticmethod
+    def _deltas(chunk):
+        """+1 for a slot becoming occupied, -1 for one becoming free, 0 for a code change."""
+        return (chunk['new'] != FREE).astype(np.int64) - (chunk['old'] != FREE)
+
+    def last_codes(self):
+        """Each slot's last logged code (uint8 array), or None if the log is empty."""
+        records = self.records()
+        if len(records) == 0:
+            return None
+        codes = np.full(int(records['slot'].max()) + 1, FREE, dtype=np.uint8)
+        for chunk in self._chunks(records, 0, len(records)):
+            # Last record of each slot in this chunk: first hit in the reversed chunk
+            reversed_slots = chunk['slot'][::-1]
+            slots, first = np.unique(reversed_slots, return_index=True)
+            codes[slots] = chunk['new'][::-1][first]
+        return codes
+
+    def _walk(self, start, end, boundaries):
+        """
+        Yields (t0, t1, occupied) arrays of intervals that cover [start, end),
+        where the number of occupied slots was constant. Intervals are also
+        split at every time in `boundaries`, so each one falls in one bucket.
+        The records of one update share a time, so the in-between counts of
+        that update come out as zero-length intervals: skip those for maxima.
+        """
+        records = self.records()
+        lo, hi = self._range(records, start, end)
+
+        # Occupied count at `start`: every change before it
+        occupied = 0
+        for chunk in self._chunks(records, 0, lo):
+            occupied += int(self._deltas(chunk).sum())
+
+        boundaries = np.asarray(boundaries, dtype=np.float64)
+        boundaries = boundaries[(boundaries > start) & (boundaries < end)]
+        prev_time, next_boundary = float(start), 0
+
+        for chunk in self._chunks(records, lo, hi):
+            times = np.asarray(chunk['time'], dtype=np.float64)
+            counts = occupied + np.cumsum(self._deltas(chunk))
+
+            # Boundaries that fall inside this chunk, with the count in force at each
+            upto = int(np.searchsorted(boundaries, times[-1], side='right'))
+            chunk_boundaries = boundaries[next_boundary:upto]
+            next_boundary = upto
+            before = np.concatenate([[occupied], counts])
+            boundary_counts = before[np.searchsorted(times, chunk_boundaries, side='right')]
+
+            points = np.concatenate([times, chunk_boundaries])
+            point_counts = np.concatenate([counts, boundary_counts])
+            order = np.argsort(points, kind='stable')
+            points, point_counts = points[order], point_counts[order]
+
+            t0 = np.concatenate([[prev_time], points[:-1]])
+            values = np.concatenate([[occupied], point_counts[:-1]])
+            yield t0, points, values
+            prev_time, occupied = float(points[-1]), int(point_counts[-1])
+
+        # Whatever is left after the last record: only boundaries change nothing
+        tail = np.concatenate([[prev_time], boundaries[next_boundary:], [float(end)]])
+        yield tail[:-1], tail[1:], np.full(len(tail) - 1, occupied)
+
+    # --- QUERIES ---
+
+    def occupancy(self, start, end, step):
+        """
+        Occupied slots over [start, end) in buckets of `step` seconds:
+        time-weighted average and the maximum seen in each bucket.
+        """
+        num_buckets = max(int(np.ceil((end - start) / step)), 0)
+        weighted = np.zeros(num_buckets)
+        peak = np.zeros(num_buckets, dtype=np.int64)
+        boundaries = start + step * np.arange(1, num_buckets)
+
+        for t0, t1, occupied in self._walk(start, end, boundaries):
+            buckets = np.clip(((t0 - start) // step).astype(np.int64), 0, max(num_buckets - 1, 0))
+            weighted += np.bincount(buckets, weights=occupied * (t1 - t0), minlength=num_buckets)
+            lasted = t1 > t0
+            np.maximum.at(peak, buckets[lasted], occupied[lasted])
+
+        bucket_starts = start + step * np.arange(num_buckets)
+        durations = np.minimum(bucket_starts + step, end) - bucket_starts
+        average = np.divide(weighted, durations, out=np.zeros(num_buckets), where=durations > 0)
+        return [
+            {"start": float(t), "average_occupied": round(float(avg), 3), "max_occupied": int(mx)}
+            for t, avg, mx in zip(bucket_starts, average, peak)
+        ]
+
+    def peak_hours(self, start, end, num_slots, utc_offset_hours=0.0):
+        """
+        Utilisation per hour of the day (local time = UTC + utc_offset_hours),
+        averaged over every day in [start, end): average occupied slots, the
+        share of the lot that represents, and the maximum seen in that hour.
+        """
+        offset = utc_offset_hours * 3600
+        first_hour = np.floor((start + offset) / 3600) * 3600 - offset
+        boundaries = np.arange(first_hour + 3600, end, 3600)
+
+        weighted = np.zeros(24)
+        observed = np.zeros(24)
+        peak = np.zeros(24, dtype=np.int64)
+        for t0, t1, occupied in self._walk(start, end, boundaries):
+            hours = (((t0 + offset) // 3600) % 24).astype(np.int64)
+            weighted += np.bincount(hours, weights=occupied * (t1 - t0), minlength=24)
+            observed += np.bincount(hours, weights=t1 - t0, minlength=24)
+            lasted = t1 > t0
+            np.maximum.at(peak, hours[lasted], occupied[lasted])
+
+        average = np.divide(weighted, observed, out=np.zeros(24), where=observed > 0)
+        return [
+            {
+                "hour": hour,
+                "average_occupied": round(float(average[hour]), 3),
+                "utilisation": round(float(average[hour]) / num_slots, 4) if num_slots else 0.0,
+                "max_occupied": int(peak[hour]),
+            }
+            for hour in range(24)
+        ]
+
+    def dwell_times(self, start, end):
+        """
+        Parking sessions (free -> occupied -> free) that started and ended in
+        [start, end), summed up per slot: how many, total, mean and longest stay.
+        """
+        records = self.records()
+        lo, hi = self._range(records, start, end)
+        num_slots = int(records['slot'].max()) + 1 if len(records) else 0
+
+        sessions = np.zeros(num_slots, dtype=np.int64)
+        total = np.zeros(num_slots)
+        longest = np.zeros(num_slots)
+        arrived_at = np.full(num_slots, np.nan)  # carried from chunk to chunk
+
+        for chunk in self._chunks(records, lo, hi):
+            was_free = chunk['old'] == FREE
+            now_free = chunk['new'] == FREE
+            events = chunk[was_free != now_free]  # arrivals and departures only
+            if len(events) == 0:
+                continue
+
+            # Group per slot; within a slot events stay in time order and alternate
+            order = np.argsort(events['slot'], kind='stable')
+            slots = events['slot'][order].astype(np.int64)
+            times = np.asarray(events['time'][order], dtype=np.float64)
+            arrival = events['old'][order] == FREE
+
+            same_slot_before = np.concatenate([[False], slots[1:] == slots[:-1]])
+            previous_time = np.concatenate([[np.nan], times[:-1]])
+            previous_arrival = np.concatenate([[False], arrival[:-1]])
+            # The previous event of the same slot, or the arrival carried in from the last chunk
+            arrival_time = np.where(same_slot_before,
+                                    np.where(previous_arrival, previous_time, np.nan),
+                                    arrived_at[slots])
+
+            departed = ~arrival & ~np.isnan(arrival_time)
+            dwell = times[departed] - arrival_time[departed]
+            np.add.at(sessions, slots[departed], 1)
+            np.add.at(total, slots[departed], dwell)
+            np.maximum.at(longest, slots[departed], dwell)
+
+            # Carry each slot's open session (last event is an arrival) to the next chunk
+            last_of_slot = np.concatenate([slots[1:] != slots[:-1], [True]])
+            arrived_at[slots[last_of_slot]] = np.where(arrival[last_of_slot], times[last_of_slot], np.nan)
+
+        return [
+            {
+                "slot": slot,
+                "sessions": int(sessions[slot]),
+                "total_seconds": round(float(total[slot]), 3),
+                "mean_seconds": round(float(total[slot] / sessions[slot]), 3),
+                "max_seconds": round(float(longest[slot]), 3),
+            }
+            for slot in np.flatnonzero(sessions).tolist()
+        ]
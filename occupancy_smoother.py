@@ -0,0 +1,49 @@
+import numpy as np
+
+from status_codec import status_array
+
+
+class OccupancySmoother:
+    """
+    Debounces the per-slot occupancy so one missed (or phantom) detection
+    doesn't flip a slot. Keeps a ring buffer of the last `window` observations
+    of every slot and counts the "occupied" votes:
+    - a free slot turns occupied once it has >= on_votes occupied observations
+    - an occupied slot turns free once it has <= off_votes occupied observations
+    - anything in between keeps the published state (hysteresis)
+    With on_votes = window // 2 + 1 and off_votes = window // 2 this is a plain
+    majority vote.
+    """
+
+    def __init__(self, num_slots, window=5, on_votes=3, off_votes=1):
+        if not 0 <= off_votes < on_votes <= window:
+            raise ValueError("Need 0 <= off_votes < on_votes <= window")
+        self.window = window
+        self.on_votes = on_votes
+        self.off_votes = off_votes
+
+        # Ring buffer: one row per observation, one column per slot
+        self.history = np.zeros((window, num_slots), dtype=bool)
+        self.position = 0
+        # Running count of occupied observations in the buffer, per slot
+        self.votes = np.zeros(num_slots, dtype=np.int32)
+        self.published = np.zeros(num_slots, dtype=bool)
+        # Last vehicle code seen in each slot ('1', 'C', 'S' or 'B')
+        self.last_code = np.full(num_slots, ord('1'), dtype=np.uint8)
+
+    def update(self, raw_status):
+        """Adds one observation (a raw status string) and returns the smoothed status string."""
+        codes = status_array(raw_status)
+        observed = codes != ord('0')
+
+        # Swap the oldest row of the ring for the new one, keeping the votes in step
+        self.votes += observed.astype(np.int32) - self.history[self.position]
+        self.history[self.position] = observed
+        self.position = (self.position + 1) % self.window
+
+        self.published = np.where(self.votes >= self.on_votes, True,
+                                  np.where(self.votes <= self.off_votes, False, self.published))
+        self.last_code = np.where(observed, codes, self.last_code)
+
+        smoothed = np.where(self.published, self.last_code, ord('0')).astype(np.uint8)
+        return smoothed.tobytes().decode('ascii')
@@ -0,0 +1,129 @@
+import hashlib
+import time
+
+import numpy as np
+import requests
+
+from detection_log import read_updates
+from lot_setup import load_lots, apply_matching_settings
+
+# Feeds a recording made with backend_brain.py's RECORD_FILE back in.
+# Run with: python replay.py
+#
+# - REPLAY_URL set: POSTs every camera's detections to a running backend
+#   (POST /api/detections?camera_id=...) and reports the request latency.
+#   Updates that had several cameras are sent one camera per request.
+# - REPLAY_URL = None: replays in-process on a fresh copy of the lots, set up
+#   from lot_setup.py exactly like the backend's (same lots, rasters,
+#   footprints, smoothing). Fully deterministic: prints a digest of every
+#   status string produced, which must match between runs and the backend.
+
+# --- CONFIGURATION ---
+RECORDING_FILE = "recordings/rush_hour.det"
+REPLAY_URL = "http://localhost:8000/api/detections"
+SPEED = 1.0            # 1.0 = real time, 10.0 = ten times faster, None = as fast as possible
+# ---------------------
+
+
+class Pacer:
+    """Sleeps so recorded update times play back at SPEED x; reports how far behind it fell."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.first_recorded = None
+        self.started = None
+
+    def wait(self, recorded_time):
+        if self.first_recorded is None:
+            self.first_recorded, self.started = recorded_time, time.monotonic()
+        if not self.speed:
+            return 0.0
+        due = self.started + (recorded_time - self.first_recorded) / self.speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return 0.0
+        return -delay
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p99 = np.percentile(values, [50, 99]) * 1000
+    return f"p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {max(values) * 1000:.2f} ms"
+
+
+def replay_http(updates, speed):
+    """Drives a running backend over HTTP, like the edges would."""
+    session = requests.Session()  # One pooled connection
+    pacer = Pacer(speed)
+    latencies, lag = [], []
+    failures = 0
+
+    for recorded_time, camera_detections in updates:
+        lag.append(pacer.wait(recorded_time))
+        for camera_id, detections in camera_detections:
+            start = time.perf_counter()
+            try:
+                response = session.post(REPLAY_URL, params={"camera_id": camera_id}, json=detections, timeout=5)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                failures += 1
+                print(f"Replay POST failed ({camera_id}): {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    print(f"Sent {len(latencies)} requests ({failures} failed)")
+    print(f"Request latency: {percentiles(latencies)}")
+    print(f"Behind schedule: {percentiles(lag)}")
+
+
+def replay_in_process(updates, speed):
+    """Applies every update exactly like backend_brain.update_lot() does, on fresh lots."""
+    registry = load_lots(map_image=None)
+    apply_matching_settings(registry)
+
+    pacer = Pacer(speed)
+    digest = hashlib.sha256()
+    update_times, lag = [], []
+    changes = 0
+
+    for recorded_time, camera_detections in updates:
+        lag.append(pacer.wait(recorded_time))
+        start = time.perf_counter()
+        lots = {}
+        for camera_id, detections in camera_detections:
+            if camera_id not in registry.cameras:
+                print(f"Skipping unknown camera '{camera_id}' (different registry than the recording?)")
+                continue
+            camera = registry.cameras[camera_id]
+            # The recorded time, not now: a replay must not depend on the wall clock
+            camera.set_detections(detections, recorded_time)
+            lots[camera.lot_id] = registry.lots[camera.lot_id]
+        for lot_id, lot in sorted(lots.items()):
+            if lot.recompute():
+                changes += 1
+                digest.update(f"{lot_id}:{lot.version}:{lot.status_string}\n".encode())
+        update_times.append(time.perf_counter() - start)
+
+    print(f"Replayed {len(update_times)} updates, {changes} status changes")
+    print(f"Update time: {percentiles(update_times)}")
+    print(f"Behind schedule: {percentiles(lag)}")
+    for lot in registry.lots.values():
+        print(f"Final [{lot.lot_id}] v{lot.version}: {lot.status_string}")
+    print(f"Status digest: {digest.hexdigest()}")
+
+
+def main():
+    updates = read_updates(RECORDING_FILE)
+    speed = f"{SPEED}x" if SPEED else "max speed"
+    if REPLAY_URL:
+        print(f"Replaying {RECORDING_FILE} into {REPLAY_URL} at {speed}")
+        replay_http(updates, SPEED)
+    else:
+        print(f"Replaying {RECORDING_FILE} in-process at {speed}")
+        replay_in_process(updates, SPEED)
+
+
+if __name__ == "__main__":
+    main()
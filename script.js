@@ -185,6 +185,7 @@ function findParking() {
 
 // --- 8. SIDEBAR & LIVE FEED (unchanged) ---
 let pollingInterval = null;
+let statusStream = null;
 let cachedConfig = [];
 async function openSidebar(lotId) {
     // Restore the original parking lot info panel
@@ -208,9 +209,8 @@ async function openSidebar(lotId) {
     `;
     document.getElementById('sidebar').classList.add('active');
     document.getElementById('sidebar').innerHTML = html;
-    window.closeSidebarPanel = function() {
-        document.getElementById('sidebar').classList.remove('active');
-    };
+    // Closing the live panel also closes its status stream
+    window.closeSidebarPanel = closeSidebar;
     // Optionally, fetch and show live data as before
     try {
         const res = await fetch(`${API_BASE_URL}/api/config`);
@@ -226,16 +226,36 @@ async function openSidebar(lotId) {
 function closeSidebar() {
     document.getElementById('sidebar').classList.remove('active');
     if (pollingInterval) clearInterval(pollingInterval);
+    if (statusStream) statusStream.close();
+}
+function applyLiveStatus(data) {
+    renderLiveGrid(data.status_string);
+    const free = data.counts.free; // counted by the backend
+    document.getElementById('sidebar-meta').innerHTML = `Live Feed • <span style="color:#0f9d58"><b>${free}</b> Slots Available</span>`;
+    showAvailabilityByType(data.availability);
+}
+function showAvailabilityByType(availability) {
+    // Free slots per slot type, counted by the backend and sent WITH the status (no extra request)
+    if (!availability) return;
+    const perType = Object.entries(availability.by_type)
+        .map(([type, counts]) => `${counts.free} ${type}`).join(' • ');
+    document.getElementById('sidebar-meta').insertAdjacentHTML('beforeend', `<br><small>${perType}</small>`);
 }
 function startLivePolling() {
+    if (statusStream) statusStream.close();
+    if (pollingInterval) clearInterval(pollingInterval);
+    // The backend pushes the status only when it changes (SSE)
+    if (window.EventSource) {
+        statusStream = new EventSource(`${API_BASE_URL}/api/status/stream`);
+        statusStream.addEventListener('status', e => applyLiveStatus(JSON.parse(e.data)));
+        statusStream.onerror = () => console.warn("Status stream interrupted, reconnecting...");
+        return;
+    }
+    // Old browsers: poll every second
     pollingInterval = setInterval(async () => {
         try {
             const res = await fetch(`${API_BASE_URL}/api/status`);
-            const data = await res.json();
-            renderLiveGrid(data.status_string);
-            const occupied = (data.status_string.match(/1|C|S|B/g) || []).length;
-            const free = data.status_string.length - occupied;
-            document.getElementById('sidebar-meta').innerHTML = `Live Feed • <span style="color:#0f9d58"><b>${free}</b> Slots Available</span>`;
+            applyLiveStatus(await res.json());
         } catch (e) { console.warn("Poll failed"); }
     }, 1000);
 }
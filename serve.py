@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+
+import uvicorn
+
+from shared_state import clear_index
+
+# Multi-worker backend: one engine process (polling, matching, pushes, the
+# debug view) + API_WORKERS processes serving /api/* from the engine's shared
+# state, so read traffic gets every core. Run with: python serve.py
+# Same settings as backend_brain.py otherwise; clients and edges still talk to PORT.
+
+# --- CONFIGURATION ---
+HOST = "0.0.0.0"
+PORT = 8000
+API_WORKERS = os.cpu_count() or 2
+ENGINE_PORT = 8001              # The engine's own port (localhost only); workers forward to it
+STATE_DIR = "/dev/shm/parking_state" if os.path.isdir("/dev/shm") else "state"  # RAM-backed where possible
+# ---------------------
+
+
+def run_engine():
+    os.environ["PARKING_ROLE"] = "engine"
+    uvicorn.run("backend_brain:app", host="127.0.0.1", port=ENGINE_PORT, log_level="warning")
+
+
+def main():
+    os.makedirs(STATE_DIR, exist_ok=True)
+    clear_index(STATE_DIR)  # Workers wait for the NEW engine's lots.json
+    os.environ["PARKING_STATE_DIR"] = STATE_DIR
+    os.environ["PARKING_ENGINE_URL"] = f"http://127.0.0.1:{ENGINE_PORT}"
+
+    engine = multiprocessing.Process(target=run_engine, name="engine")
+    engine.start()
+    print(f"Engine on 127.0.0.1:{ENGINE_PORT} (pid {engine.pid}), {API_WORKERS} API workers on {HOST}:{PORT}")
+    try:
+        # The workers inherit the environment: they start in the "api" role
+        os.environ["PARKING_ROLE"] = "api"
+        uvicorn.run("backend_brain:app", host=HOST, port=PORT, workers=API_WORKERS)
+    finally:
+        engine.terminate()
+        engine.join(10)
+
+
+if __name__ == "__main__":
+    main()
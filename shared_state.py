@@ -0,0 +1,364 @@
+import json
+import mmap
+import os
+import struct
+import time
+
+from slot_finder import SlotFinder
+from status_codec import diff_status, status_token
+
+# The live status of every lot, shared between the engine process (matching,
+# see backend_brain.py) and any number of API worker processes (serve.py).
+#
+# One memory-mapped file per lot in the state directory (/dev/shm = RAM):
+#   header:  magic, seq, version, retired, slots, ring size, summary length, config ETag,
+#            epoch (the engine's BOOT_EPOCH, see status_codec.status_token)
+#   summary: the lot's counts and availability as JSON (SUMMARY_CAPACITY bytes)
+#   ring:    the last `ring` status strings, each as (version u8, slot codes), slot
+#            version % ring: the newest one is the current status, the rest serve deltas
+# Plus <lot_id>.config.json (the config the engine is using, with its ETag) and
+# lots.json (which lots).
+#
+# Seqlock: the single writer (the engine, under the lot's lock) makes `seq` odd,
+# writes, then makes it even again. Readers copy what they need and retry if
+# `seq` was odd or moved meanwhile, so they never block the engine and never
+# see half an update. A file replaced by a new one (restart, slot count
+# changed) is flagged `retired` and readers reopen the path.
+#
+# Plain mmap'd files rather than multiprocessing.shared_memory: its resource
+# tracker deletes the segment when any attached worker exits (Python < 3.13).
+
+MAGIC = b"PRKSTAT2"
+HEADER = struct.Struct('<8sQQIIII40s16s')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 8
+VERSION_OFFSET = 16
+RETIRED_OFFSET = 24
+SIZES_OFFSET = 28          # slots, ring
+SUMMARY_LENGTH_OFFSET = 36
+ETAG_OFFSET = 40
+EPOCH_OFFSET = 80
+SUMMARY_OFFSET = 128
+SUMMARY_CAPACITY = 256 * 1024
+RING_OFFSET = SUMMARY_OFFSET + SUMMARY_CAPACITY
+
+INDEX_FILE = "lots.json"
+# Reads that keep colliding with writes give up after this many tries
+MAX_READ_ATTEMPTS = 10_000
+
+
+def _entry_size(slots):
+    return 8 + (slots + 7) // 8 * 8  # Version + codes, kept 8-byte aligned
+
+
+def status_path(state_dir, lot_id):
+    return os.path.join(state_dir, f"{lot_id}.status")
+
+
+def config_path(state_dir, lot_id):
+    return os.path.join(state_dir, f"{lot_id}.config.json")
+
+
+def _write_atomic(path, data):
+    # Write then rename, so a reader never sees half a file
+    temp_file = path + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)
+
+
+def _retire(path):
+    """Flags an existing status file as replaced, so readers still mapping it reopen the path."""
+    try:
+        with open(path, 'r+b') as f:
+            f.seek(RETIRED_OFFSET)
+            f.write(struct.pack('<I', 1))
+    except (OSError, ValueError):
+        pass
+
+
+def _summary(counts, availability):
+    return json.dumps({"counts": counts, "availability": availability}).encode()
+
+
+def _widest(value, number):
+    """The same JSON shape with every count replaced by `number`."""
+    if isinstance(value, dict):
+        return {key: _widest(item, number) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_widest(item, number) for item in value]
+    return number if isinstance(value, int) and not isinstance(value, bool) else value
+
+
+def check_summary_fits(num_slots, counts, availability):
+    """
+    Raises ValueError if a lot's summary could ever outgrow SUMMARY_CAPACITY:
+    every count at its widest (num_slots). The layout (zones x types) only
+    changes with the config, so call this when a lot is set up or its config
+    reloaded - never find out halfway through publishing a status.
+    """
+    size = len(_summary(_widest(counts, num_slots), _widest(availability, num_slots)))
+    if size > SUMMARY_CAPACITY:
+        raise ValueError(f"Counts too big for the shared state ({size} bytes, max {SUMMARY_CAPACITY}): "
+                         f"fewer zones / slot types, or a bigger SUMMARY_CAPACITY")
+
+
+class StatusWriter:
+    """The engine's side of one lot's status file. Not thread-safe: call under the lot's lock."""
+
+    def __init__(self, state_dir, lot_id, slots, ring, epoch):
+        self.state_dir = state_dir
+        self.lot_id = lot_id
+        self.path = status_path(state_dir, lot_id)
+        self.ring = ring
+        self.epoch = epoch
+        self._map = None
+        self._create(slots)
+
+    def _create(self, slots):
+        self.slots = slots
+        self.entry_size = _entry_size(slots)
+        size = RING_OFFSET + self.ring * self.entry_size
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'w+b') as f:
+            f.truncate(size)
+            new_map = mmap.mmap(f.fileno(), size)
+        etag = self.config_etag if self._map is not None else b""
+        HEADER.pack_into(new_map, 0, MAGIC, 0, 0, 0, slots, self.ring, 0, etag, self.epoch.encode('ascii'))
+        # The ring starts out with no version in any entry
+        for index in range(self.ring):
+            struct.pack_into('<q', new_map, RING_OFFSET + index * self.entry_size, -1)
+        _retire(self.path)
+        os.replace(temp_file, self.path)
+        if self._map is not None:
+            self._map.close()
+        self._map = new_map
+
+    @property
+    def config_etag(self):
+        return HEADER.unpack_from(self._map, 0)[7]
+
+    def _begin(self):
+        seq = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+        SEQ.pack_into(self._map, SEQ_OFFSET, seq + 1)
+        return seq
+
+    def _end(self, seq):
+        SEQ.pack_into(self._map, SEQ_OFFSET, seq + 2)
+
+    def publish(self, version, status_string, counts, availability=None):
+        summary = _summary(counts, availability)
+        if len(summary) > SUMMARY_CAPACITY:
+            # check_summary_fits() at setup/reload rules this out
+            raise ValueError(f"Counts too big for the shared state ({len(summary)} bytes)")
+        offset = RING_OFFSET + (version % self.ring) * self.entry_size
+        seq = self._begin()
+        struct.pack_into('<q', self._map, offset, version)
+        self._map[offset + 8:offset + 8 + self.slots] = status_string.encode('ascii')
+        self._map[SUMMARY_OFFSET:SUMMARY_OFFSET + len(summary)] = summary
+        struct.pack_into('<I', self._map, SUMMARY_LENGTH_OFFSET, len(summary))
+        struct.pack_into('<Q', self._map, VERSION_OFFSET, version)
+        self._end(seq)
+
+    def publish_config(self, config, etag):
+        """Saves the config the engine now uses, then points readers at it by its ETag."""
+        _write_atomic(config_path(self.state_dir, self.lot_id),
+                      json.dumps({"etag": etag, "config": config}).encode())
+        seq = self._begin()
+        struct.pack_into('<40s', self._map, ETAG_OFFSET, etag.encode('ascii'))
+        self._end(seq)
+
+    def resize(self, slots):
+        """A new file for a new slot count (old versions can't be diffed against it anyway)."""
+        self._create(slots)
+
+    def close(self):
+        self._map.close()
+
+
+class StatusReader:
+    """An API worker's view of one lot's status file (see the top of this file)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:8] != MAGIC:
+            raise ValueError(f"{self.path} is not a status file")
+        self.slots, self.ring = struct.unpack_from('<II', self._map, SIZES_OFFSET)
+        self.entry_size = _entry_size(self.slots)
+        self.epoch = struct.unpack_from('<16s', self._map, EPOCH_OFFSET)[0].rstrip(b'\0').decode('ascii')
+
+    def refresh(self):
+        """Reopens the path if the engine replaced the file. Returns True if it did."""
+        if struct.unpack_from('<I', self._map, RETIRED_OFFSET)[0] == 0:
+            return False
+        old_map = self._map
+        self._open()
+        old_map.close()
+        return True
+
+    @property
+    def version(self):
+        return SEQ.unpack_from(self._map, VERSION_OFFSET)[0]
+
+    def _consistent(self, read):
+        """Runs read() until it saw no write in progress (seqlock)."""
+        for attempt in range(MAX_READ_ATTEMPTS):
+            before = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+            if before & 1:
+                time.sleep(0)  # Writer busy: let it finish
+                continue
+            result = read()
+            if SEQ.unpack_from(self._map, SEQ_OFFSET)[0] == before:
+                return result
+        raise RuntimeError(f"No consistent read of {self.path} (engine stuck mid-write?)")
+
+    def _entry(self, version):
+        offset = RING_OFFSET + (version % self.ring) * self.entry_size
+        if struct.unpack_from('<q', self._map, offset)[0] != version:
+            return None
+        return self._map[offset + 8:offset + 8 + self.slots]
+
+    def read(self):
+        """(version, status bytes, summary JSON bytes) of one update."""
+        def read():
+            version = SEQ.unpack_from(self._map, VERSION_OFFSET)[0]
+            summary_length = struct.unpack_from('<I', self._map, SUMMARY_LENGTH_OFFSET)[0]
+            return version, self._entry(version), self._map[SUMMARY_OFFSET:SUMMARY_OFFSET + summary_length]
+        return self._consistent(read)
+
+    def status_of(self, version):
+        """The status bytes of an older version, or None once the ring has moved past it."""
+        return self._consistent(lambda: self._entry(version))
+
+    @property
+    def config_etag(self):
+        return struct.unpack_from('<40s', self._map, ETAG_OFFSET)[0].rstrip(b'\0').decode('ascii')
+
+
+class SharedLot:
+    """
+    Read-only stand-in for a Lot in an API worker: the same version / latest()
+    / changes_since() / config the endpoints use, served from the engine's
+    status file. No cameras, no matching.
+    """
+
+    def __init__(self, state_dir, lot_id):
+        self.lot_id = lot_id
+        self.state_dir = state_dir
+        self.reader = StatusReader(status_path(state_dir, lot_id))
+        self.history_log = None  # History lives with the engine (requests are forwarded there)
+        self._snapshot = None
+        self._config = None
+        self._config_etag = None
+        self._slot_finder = (None, None)  # (config ETag, SlotFinder)
+
+    def _refresh(self):
+        if self.reader.refresh():
+            self._snapshot = None  # Version numbers restart with a new file
+
+    @property
+    def version(self):
+        self._refresh()
+        return self.reader.version
+
+    @property
+    def epoch(self):
+        """The engine's BOOT_EPOCH (a restarted engine writes a new file, so a new one)."""
+        self._refresh()
+        return self.reader.epoch
+
+    def status_etag(self, fmt="full", version=None):
+        version = self.version if version is None else version
+        suffix = "" if fmt == "full" else f"-{fmt}"
+        return f'"{self.lot_id}-{status_token(self.epoch, version)}{suffix}"'
+
+    def _current(self):
+        """(version, status_string, counts, availability) of one update, parsed once per version."""
+        self._refresh()
+        snapshot = self._snapshot
+        if snapshot is None or self.reader.version != snapshot[0]:
+            version, codes, summary = self.reader.read()
+            summary = json.loads(summary)
+            snapshot = self._snapshot = (version, codes.decode('ascii'), summary["counts"], summary["availability"])
+        return snapshot
+
+    def latest(self):
+        return self._current()
+
+    def latest_availability(self):
+        version, _, _, availability = self._current()
+        return version, availability
+
+    def changes_since(self, version, current_status):
+        if version < 0:
+            return None
+        past_status = self.reader.status_of(version)
+        if past_status is None or len(past_status) != len(current_status):
+            return None
+        return diff_status(past_status.decode('ascii'), current_status)
+
+    @property
+    def config(self):
+        """The config the engine uses, re-read when the engine reloads it."""
+        self._refresh()
+        if self._config is None or self.reader.config_etag != self._config_etag:
+            with open(config_path(self.state_dir, self.lot_id), 'rb') as f:
+                saved = json.load(f)
+            # The ETag saved WITH the config (the file may be newer than the header we checked)
+            self._config, self._config_etag = saved["config"], saved["etag"]
+        return self._config
+
+    @property
+    def config_etag(self):
+        self.config  # Loads it if the engine moved on
+        return self._config_etag
+
+    @property
+    def slot_finder(self):
+        """Built from the engine's config, again whenever that changes."""
+        config = self.config
+        etag, finder = self._slot_finder
+        if etag != self._config_etag:
+            finder = SlotFinder(config)
+            self._slot_finder = (self._config_etag, finder)
+        return finder
+
+
+def write_index(state_dir, lot_ids):
+    """lots.json: which lots the engine publishes, default lot first."""
+    _write_atomic(os.path.join(state_dir, INDEX_FILE), json.dumps({"lots": list(lot_ids)}).encode())
+
+
+def clear_index(state_dir):
+    """Called before an engine starts, so API workers wait for ITS lots.json."""
+    try:
+        os.remove(os.path.join(state_dir, INDEX_FILE))
+    except FileNotFoundError:
+        pass
+
+
+class SharedRegistry:
+    """The API workers' Registry: just the lots, as SharedLots."""
+
+    def __init__(self, state_dir, timeout=300.0):
+        index_file = os.path.join(state_dir, INDEX_FILE)
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(index_file):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"No engine published {index_file} within {timeout:.0f}s")
+            time.sleep(0.2)
+        with open(index_file, 'r') as f:
+            lot_ids = json.load(f)['lots']
+        self.lots = {lot_id: SharedLot(state_dir, lot_id) for lot_id in lot_ids}
+        self.cameras = {}
+
+    @property
+    def default_lot(self):
+        return next(iter(self.lots.values()))
@@ -1,17 +1,74 @@
 import cv2
+import os
+import sys
+import json
+import time
+import requests
 import uvicorn
-from fastapi import FastAPI
-from threading import Thread
+from fastapi import FastAPI, Response
+from threading import Thread, Lock
 import numpy as np
+from synthetic_lot import make_lot_config, make_homography, slot_centers
+
+try:
+    # Optional: GET /metrics for Prometheus (pip install prometheus_client)
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+except ImportError:
+    generate_latest = None
 
 # --- CONFIGURATION ---
 IMAGE_PATH = 'camera_view.png'  # The angled CCTV screenshot
 HOST = "0.0.0.0"
 PORT = 5000                     # The port backend_brain checks
+PUSH_URL = None                 # e.g. "http://localhost:8000/api/detections" to push instead of being polled
+PUSH_INTERVAL = 0.02            # How often (seconds) to check for moved cars when pushing
+
+# --- HEADLESS MODE (python simulator.py --headless) ---
+# No window: thousands of scripted cars on a synthetic lot, seen by several
+# simulated cameras. Writes SIM_DIR/registry.json (lot config + one matrix per
+# camera) for backend_brain.py: set REGISTRY_FILE in lot_setup.py to that file.
+HEADLESS = False                # Or pass --headless
+SIM_DIR = "sim"
+SIM_SLOTS = 4000                # Slots in the synthetic lot
+SIM_INITIAL_OCCUPANCY = 0.6     # Share of slots already taken at start
+SIM_ARRIVALS_PER_SECOND = 5.0   # New cars driving in (Poisson)
+SIM_MEAN_DWELL = 600.0          # Seconds a car stays parked (exponential)
+SIM_SPEED = 150.0               # Map pixels per second while driving
+SIM_WORLD_HZ = 20               # Simulation steps per second
+SIM_SEED = 0                    # Same seed = same traffic
+# One entry per camera, each watching its own strip of the lot (strips overlap a bit).
+# "port": serve GET /detections there; "push_url": POST every frame there instead (or as well).
+# "fps": frames per second, "jitter": random +- seconds on each frame's timing,
+# "noise": pixel noise on each detection (like a real detector's wobble),
+# "frame_size": [w, h] resolution (default SIM_FRAME_SIZE; the backend builds its slot raster from it).
+SIM_FRAME_SIZE = (1920, 1080)
+SIM_CAMERAS = [
+    {"port": 5001, "fps": 10, "jitter": 0.01, "noise": 2.0},
+    {"port": 5002, "fps": 10, "jitter": 0.01, "noise": 2.0},
+    {"port": 5003, "fps": 5, "jitter": 0.05, "noise": 4.0},
+    {"push_url": "http://localhost:8000/api/detections", "fps": 5, "jitter": 0.05, "noise": 4.0},
+]
+SIM_STRIP_OVERLAP = 0.1         # Share of a strip's width shared with its neighbours
 # ---------------------
 
 app = FastAPI()
 
+if generate_latest:
+    SIM_FRAMES = Counter("sim_frames_total", "Frames produced by a simulated camera", ["camera"])
+    SIM_PUSH_ERRORS = Counter("sim_push_errors_total", "Failed pushes to the backend", ["camera"])
+    SIM_PUSH_SECONDS = Histogram("sim_push_seconds", "POST of one frame to the backend", ["camera"],
+                                 buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+def add_metrics_route(server_app):
+    """GET /metrics on the given FastAPI app (all apps share one registry)."""
+    @server_app.get("/metrics")
+    def get_metrics():
+        if generate_latest is None:
+            return Response(content="prometheus_client is not installed\n", status_code=501)
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+add_metrics_route(app)
+
 # Global State for Virtual Cars
 # We store them as a dict: {id: [x, y]}
 virtual_cars = {}
@@ -38,6 +95,24 @@ def get_detections():
     
     return output_list
 
+def push_loop():
+    """
+    Pushes the detections to the backend whenever a car moves (or is cleared).
+    Nothing is sent while the scene stays the same.
+    """
+    session = requests.Session()  # Reuse one connection
+    last_sent = None
+
+    while True:
+        detections = get_detections()
+        if detections != last_sent:
+            try:
+                session.post(PUSH_URL, json=detections, timeout=1)
+                last_sent = detections
+            except Exception as e:
+                print(f"Push to backend failed: {e}")
+        time.sleep(PUSH_INTERVAL)
+
 def mouse_callback(event, x, y, flags, param):
     global active_car_id
     
@@ -65,6 +140,8 @@ def run_gui():
 
     print("--- SIMULATOR RUNNING ---")
     print(f"API Active at: http://localhost:{PORT}/detections")
+    if PUSH_URL:
+        print(f"Pushing changes to: {PUSH_URL}")
     print("CONTROLS:")
     print("  [Left Click]  -> Move Car 1 (Blue)")
     print("  [Right Click] -> Move Car 2 (Red)")
@@ -113,10 +190,231 @@ def run_gui():
 
     cv2.destroyAllWindows()
 
+# --- HEADLESS MODE ---
+
+class TrafficWorld:
+    """
+    Every car of the synthetic lot, in map pixels. Cars arrive at the entrance
+    (middle of the left edge), drive straight to a free slot, park for a random
+    time and drive back out. All NumPy arrays, so thousands of cars are cheap.
+    """
+
+    ARRIVING, PARKED, LEAVING = 0, 1, 2
+
+    def __init__(self, config):
+        self.rng = np.random.default_rng(SIM_SEED)
+        self.centers = slot_centers(config)
+        self.entrance = np.float32([0, config['image_dimensions']['height'] / 2])
+        self.slot_taken = np.zeros(len(self.centers), dtype=bool)
+        self.lock = Lock()
+
+        # Start with SIM_INITIAL_OCCUPANCY of the lot parked
+        parked = self.rng.permutation(len(self.centers))[:int(len(self.centers) * SIM_INITIAL_OCCUPANCY)]
+        self.slot_taken[parked] = True
+        self.position = self.centers[parked].copy()
+        self.target = self.centers[parked].copy()
+        self.slot = parked.astype(np.int64)
+        self.state = np.full(len(parked), self.PARKED, dtype=np.int8)
+        self.depart_at = self.rng.exponential(SIM_MEAN_DWELL, size=len(parked))
+        self.clock = 0.0
+
+    def step(self, dt):
+        self.clock += dt
+        with self.lock:
+            # Departures: the slot is free as soon as the car pulls out
+            leaving = (self.state == self.PARKED) & (self.depart_at <= self.clock)
+            self.slot_taken[self.slot[leaving]] = False
+            self.state[leaving] = self.LEAVING
+            self.target[leaving] = self.entrance
+
+            # Arrivals: each gets a random free slot
+            free = np.flatnonzero(~self.slot_taken)
+            arrivals = min(int(self.rng.poisson(SIM_ARRIVALS_PER_SECOND * dt)), len(free))
+            if arrivals:
+                slots = self.rng.choice(free, size=arrivals, replace=False)
+                self.slot_taken[slots] = True
+                self.position = np.concatenate([self.position, np.repeat(self.entrance[None], arrivals, axis=0)])
+                self.target = np.concatenate([self.target, self.centers[slots]])
+                self.slot = np.concatenate([self.slot, slots])
+                self.state = np.concatenate([self.state, np.full(arrivals, self.ARRIVING, dtype=np.int8)])
+                self.depart_at = np.concatenate([self.depart_at, np.full(arrivals, np.inf)])
+
+            # Movement: straight towards the target
+            moving = self.state != self.PARKED
+            offset = self.target[moving] - self.position[moving]
+            distance = np.linalg.norm(offset, axis=1)
+            reached = distance <= SIM_SPEED * dt
+            scale = np.where(reached, 1.0, SIM_SPEED * dt / np.maximum(distance, 1e-6))
+            self.position[moving] += offset * scale[:, None].astype(np.float32)
+
+            moving_index = np.flatnonzero(moving)
+            parked_now = moving_index[reached & (self.state[moving] == self.ARRIVING)]
+            self.state[parked_now] = self.PARKED
+            self.depart_at[parked_now] = self.clock + self.rng.exponential(SIM_MEAN_DWELL, size=len(parked_now))
+
+            gone = moving_index[reached & (self.state[moving] == self.LEAVING)]
+            if len(gone):
+                keep = np.ones(len(self.state), dtype=bool)
+                keep[gone] = False
+                self.position, self.target = self.position[keep], self.target[keep]
+                self.slot, self.state, self.depart_at = self.slot[keep], self.state[keep], self.depart_at[keep]
+
+    def snapshot(self):
+        """(car positions, states), copied so cameras can read while the world moves."""
+        with self.lock:
+            return self.position.copy(), self.state.copy()
+
+    def run(self):
+        dt = 1.0 / SIM_WORLD_HZ
+        next_step = time.monotonic()
+        while True:
+            self.step(dt)
+            next_step += dt
+            time.sleep(max(next_step - time.monotonic(), 0))
+
+
+class SimCamera:
+    """
+    One simulated camera: sees the cars in its strip of the map, turns them
+    into camera pixels with the inverse of its matrix and serves/pushes them.
+    """
+
+    def __init__(self, camera_id, spec, region, h_matrix, world, seed=0):
+        self.camera_id = camera_id
+        self.spec = spec
+        self.frame_size = tuple(spec.get("frame_size", SIM_FRAME_SIZE))
+        self.region = region
+        self.h_matrix = h_matrix
+        self.inverse = np.linalg.inv(h_matrix)
+        self.world = world
+        self.rng = np.random.default_rng(seed)
+        # Latest frame, already encoded: GET /detections just hands the bytes out
+        self.latest_body = b"[]"
+        self.stats = {"frames": 0, "cars": 0, "pushed": 0, "push_errors": 0}
+
+    def detections(self):
+        position, _ = self.world.snapshot()
+        x1, y1, x2, y2 = self.region
+        seen = position[(position[:, 0] >= x1) & (position[:, 0] < x2) &
+                        (position[:, 1] >= y1) & (position[:, 1] < y2)]
+        if len(seen) == 0:
+            return []
+        seen = seen + self.rng.normal(0, self.spec.get("noise", 0.0), size=seen.shape).astype(np.float32)
+        pixels = cv2.perspectiveTransform(seen.reshape(-1, 1, 2), self.inverse).reshape(-1, 2)
+        return [{"x": round(x, 1), "y": round(y, 1), "type": "car"} for x, y in pixels.tolist()]
+
+    def app(self):
+        camera_app = FastAPI()
+
+        @camera_app.get("/detections")
+        def camera_detections():
+            return Response(content=self.latest_body, media_type="application/json")
+
+        add_metrics_route(camera_app)
+        return camera_app
+
+    def run(self):
+        session = requests.Session()  # Reuse one connection
+        interval = 1.0 / self.spec.get("fps", 10)
+        jitter = self.spec.get("jitter", 0.0)
+        push_url = self.spec.get("push_url")
+        while True:
+            detections = self.detections()
+            self.latest_body = json.dumps(detections).encode()
+            self.stats["frames"] += 1
+            self.stats["cars"] = len(detections)
+            if generate_latest:
+                SIM_FRAMES.labels(self.camera_id).inc()
+            if push_url:
+                started = time.perf_counter()
+                try:
+                    session.post(push_url, params={"camera_id": self.camera_id}, data=self.latest_body,
+                                 headers={"Content-Type": "application/json"}, timeout=1)
+                    self.stats["pushed"] += 1
+                    if generate_latest:
+                        SIM_PUSH_SECONDS.labels(self.camera_id).observe(time.perf_counter() - started)
+                except Exception:
+                    self.stats["push_errors"] += 1
+                    if generate_latest:
+                        SIM_PUSH_ERRORS.labels(self.camera_id).inc()
+            time.sleep(max(interval + self.rng.uniform(-jitter, jitter), 0))
+
+
+def camera_regions(config, num_cameras):
+    """Splits the map into num_cameras vertical strips that overlap by SIM_STRIP_OVERLAP."""
+    width = config['image_dimensions']['width']
+    height = config['image_dimensions']['height']
+    strip = width / num_cameras
+    overlap = strip * SIM_STRIP_OVERLAP
+    return [(max(index * strip - overlap, 0), 0, min((index + 1) * strip + overlap, width), height)
+            for index in range(num_cameras)]
+
+
+def write_sim_registry(config, cameras):
+    """Saves the lot, each camera's matrix and a registry.json pointing at them into SIM_DIR."""
+    os.makedirs(SIM_DIR, exist_ok=True)
+    with open(os.path.join(SIM_DIR, "lot.json"), 'w') as f:
+        json.dump(config, f)
+    spec = {"lots": {config['lot_id']: {"config": "lot.json"}}, "cameras": {}}
+    for camera in cameras:
+        np.save(os.path.join(SIM_DIR, f"{camera.camera_id}.npy"), camera.h_matrix)
+        camera_spec = {"lot_id": config['lot_id'], "matrix": f"{camera.camera_id}.npy",
+                       "frame_size": list(camera.frame_size)}
+        if "port" in camera.spec:
+            camera_spec["edge_url"] = f"http://localhost:{camera.spec['port']}/detections"
+        spec["cameras"][camera.camera_id] = camera_spec
+    registry_file = os.path.join(SIM_DIR, "registry.json")
+    with open(registry_file, 'w') as f:
+        json.dump(spec, f, indent=4)
+    return registry_file
+
+
+def run_headless():
+    config = make_lot_config(SIM_SLOTS, lot_id="sim_lot", seed=SIM_SEED)
+    world = TrafficWorld(config)
+
+    cameras = []
+    for index, (spec, region) in enumerate(zip(SIM_CAMERAS, camera_regions(config, len(SIM_CAMERAS)))):
+        h_matrix = make_homography(config, tuple(spec.get("frame_size", SIM_FRAME_SIZE)),
+                                   seed=SIM_SEED + index, region=region)
+        cameras.append(SimCamera(f"sim_cam_{index}", spec, region, h_matrix, world, seed=SIM_SEED + index))
+    registry_file = write_sim_registry(config, cameras)
+
+    print("--- HEADLESS SIMULATOR RUNNING ---")
+    print(f"{SIM_SLOTS} slots, {len(world.state)} cars parked at start, {len(cameras)} cameras")
+    print(f"Backend: set REGISTRY_FILE = \"{registry_file}\" in lot_setup.py")
+
+    Thread(target=world.run, daemon=True).start()
+    for camera in cameras:
+        if "port" in camera.spec:
+            Thread(target=uvicorn.run, args=(camera.app(),), daemon=True,
+                   kwargs={"host": HOST, "port": camera.spec["port"], "log_level": "error"}).start()
+            print(f"  {camera.camera_id}: http://localhost:{camera.spec['port']}/detections")
+        if camera.spec.get("push_url"):
+            print(f"  {camera.camera_id}: pushing to {camera.spec['push_url']}")
+        Thread(target=camera.run, daemon=True).start()
+
+    try:
+        while True:
+            time.sleep(5)
+            _, state = world.snapshot()
+            print(f"[t={world.clock:.0f}s] cars: {len(state)} "
+                  f"(parked {int((state == TrafficWorld.PARKED).sum())}, driving {int((state != TrafficWorld.PARKED).sum())}) | "
+                  + " | ".join(f"{camera.camera_id}: {camera.stats}" for camera in cameras))
+    except KeyboardInterrupt:
+        pass
+
 # Run FastAPI in a separate thread so it doesn't block the GUI
 if __name__ == "__main__":
+    if HEADLESS or "--headless" in sys.argv:
+        run_headless()
+        sys.exit(0)
+
     server_thread = Thread(target=uvicorn.run, args=(app,), kwargs={"host": HOST, "port": PORT, "log_level": "error"}, daemon=True)
     server_thread.start()
+
+    if PUSH_URL:
+        Thread(target=push_loop, daemon=True).start()
     
     # Run GUI in main thread
     run_gui()
\ No newline at end of file
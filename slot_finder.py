@@ -0,0 +1,115 @@
+import numpy as np
+
+from status_codec import status_array
+
+try:
+    from scipy.spatial import cKDTree  # KD-tree queries (in requirements.txt)
+except ImportError:
+    cKDTree = None
+    print("WARNING: scipy not installed, nearest-free-slot queries measure every free slot "
+          "(slow on big lots). pip install -r requirements.txt")
+
+# "Which free slot of my type is closest to here?" for guidance displays and
+# mobile clients. The slot centres (map pixels, from config.json) of each slot
+# type go into a KD-tree ONCE per config. A query asks the tree for a few more
+# candidates than it needs - as many as the free share of that type says it
+# will take to meet k free ones - and drops the occupied ones. With few free
+# slots left it simply measures the distance to each of them instead.
+# Without scipy (a degraded mode: install requirements.txt) every query is
+# that direct measurement, fine up to a few thousand slots only.
+
+FREE = ord('0')
+ANY_TYPE = None
+# At or below this many free slots the direct measurement beats the tree
+DIRECT_MAX_FREE = 1024
+
+
+class SlotFinder:
+    """Nearest-free-slot index for one lot config (rebuilt when the config changes)."""
+
+    def __init__(self, config):
+        slots = config['slots']
+        self.num_slots = len(slots)
+        self.centers = np.array([[slot['coordinates']['x'] + slot['coordinates']['w'] / 2,
+                                  slot['coordinates']['y'] + slot['coordinates']['h'] / 2]
+                                 for slot in slots], dtype=np.float64).reshape(-1, 2)
+        types = np.array([str(slot.get('type', 'car')) for slot in slots])
+        # Named points to search from, e.g. "entrances": {"main_gate": {"x": 400, "y": 20}}
+        self.entrances = {name: (float(point['x']), float(point['y']))
+                          for name, point in config.get('entrances', {}).items()}
+
+        # Per slot type (and ANY_TYPE = all slots): the slot indices and their tree
+        self.groups = {}
+        for slot_type in [ANY_TYPE] + sorted(set(types.tolist())):
+            indices = np.arange(self.num_slots) if slot_type is ANY_TYPE else np.flatnonzero(types == slot_type)
+            tree = cKDTree(self.centers[indices]) if cKDTree is not None and len(indices) else None
+            self.groups[slot_type] = (indices, tree)
+        # (version, {slot type: (free mask over the group, positions of the free ones)})
+        self._free = (None, None)
+
+    @property
+    def slot_types(self):
+        return [slot_type for slot_type in self.groups if slot_type is not ANY_TYPE]
+
+    def free_groups(self, version, status_string):
+        """Which slots of each group are free, worked out once per status version."""
+        cached_version, groups = self._free
+        if cached_version == version and groups is not None:
+            return groups
+        free = status_array(status_string) == FREE
+        groups = {}
+        for slot_type, (indices, _) in self.groups.items():
+            free_in_group = free[indices]
+            groups[slot_type] = (free_in_group, np.flatnonzero(free_in_group))
+        self._free = (version, groups)
+        return groups
+
+    def nearest(self, point, k, slot_type, free_groups):
+        """
+        The k nearest free slots of slot_type (ANY_TYPE = any) to the map point,
+        nearest first: (slot indices, distances in map pixels).
+        """
+        indices, tree = self.groups[slot_type]
+        free_in_group, free_positions = free_groups[slot_type]
+        k = min(k, len(free_positions))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        if tree is None or len(free_positions) <= DIRECT_MAX_FREE:
+            # Few free ones (or no scipy): measure them all
+            distances = np.hypot(*(self.centers[indices[free_positions]] - point).T)
+            closest = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+            closest = closest[np.argsort(distances[closest], kind='stable')]
+            return indices[free_positions[closest]], distances[closest]
+
+        # With a share f of the group free, about k / f of the nearest hold k free ones
+        wanted = min(int(k * len(indices) / len(free_positions) * 2) + 8, len(indices))
+        while True:
+            distances, positions = tree.query(point, k=wanted)
+            distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+            is_free = free_in_group[positions]
+            if np.count_nonzero(is_free) >= k or wanted == len(indices):
+                break
+            wanted = min(wanted * 4, len(indices))  # Unlucky spot (a full corner): look further
+        return indices[positions[is_free][:k]], distances[is_free][:k]
+
+
+def nearest_free_slots(lot, point, k=5, slot_type=ANY_TYPE):
+    """
+    (version, [{"index", "id", "label", "type", "x", "y", "distance"}, ...]) for
+    a Lot or SharedLot: its k nearest free slots of slot_type to `point`.
+    """
+    finder = lot.slot_finder
+    config = lot.config
+    version, status_string, *_ = lot.latest()
+    if len(status_string) != finder.num_slots:
+        return version, []  # Mid-reload: the slot count is changing
+    slot_indices, distances = finder.nearest(point, k, slot_type, finder.free_groups(version, status_string))
+    results = []
+    for index, distance in zip(slot_indices.tolist(), distances.tolist()):
+        slot = config['slots'][index]
+        x, y = finder.centers[index]
+        results.append({"index": index, "id": slot.get('id', index), "label": slot.get('label'),
+                        "type": slot.get('type', 'car'), "x": round(float(x), 1), "y": round(float(y), 1),
+                        "distance": round(distance, 1)})
+    return version, results
@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+
+
+def build_slot_rects(config):
+    """
+    Turns the slots in config.json into one (N, 4) float32 array of
+    [x_min, y_min, x_max, y_max] rows, in the same order as config['slots'].
+    Build this ONCE when the config loads, not every tick.
+    """
+    rects = np.zeros((len(config['slots']), 4), dtype=np.float32)
+    for index, slot in enumerate(config['slots']):
+        coords = slot['coordinates']
+        rects[index] = (coords['x'], coords['y'],
+                        coords['x'] + coords['w'], coords['y'] + coords['h'])
+    return rects
+
+
+def detections_to_boxes(raw_detections):
+    """
+    Pulls the detections out of a detection list: an (M, 4) float32 array of
+    [x, y, w, h] camera pixel rows (x, y = box centre, as YOLO's xywh). w and h
+    are NaN for detections that are only a point (no box size sent). Entries
+    without an 'x' are skipped, same as the old defensive check.
+    """
+    boxes = [(det['x'], det['y'], det.get('w', np.nan), det.get('h', np.nan))
+             for det in raw_detections if 'x' in det]
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def transform_points(points, h_matrix):
+    """Camera pixels -> map pixels for ALL points with a single cv2 call."""
+    if len(points) == 0:
+        return np.zeros((0, 2), dtype=np.float32)
+    transformed = cv2.perspectiveTransform(points.reshape(-1, 1, 2), h_matrix)
+    # int() truncation, same as the original per-point code
+    return np.trunc(transformed.reshape(-1, 2))
+
+
+class SlotGrid:
+    """
+    Uniform grid over the top-down map so a point only gets tested against
+    the few slots whose rectangle touches its cell, not every slot in the lot.
+    Build it ONCE when the config loads.
+    """
+
+    def __init__(self, slot_rects, cell_size=None):
+        self.slot_rects = slot_rects
+        num_slots = len(slot_rects)
+
+        if cell_size is None:
+            # Roughly one slot per cell: median of the slot sizes
+            if num_slots:
+                sizes = np.concatenate([slot_rects[:, 2] - slot_rects[:, 0],
+                                        slot_rects[:, 3] - slot_rects[:, 1]])
+                cell_size = float(np.median(sizes))
+            cell_size = max(cell_size or 1.0, 1.0)
+        self.cell_size = cell_size
+
+        if num_slots:
+            self.origin = slot_rects[:, :2].min(axis=0)
+            extent = slot_rects[:, 2:].max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2, dtype=np.float32)
+            extent = np.zeros(2, dtype=np.float32)
+        self.cols, self.rows = (np.floor(extent / cell_size).astype(int) + 1)
+
+        # Which slots touch which cell. Slots are appended in config order,
+        # so the first hit in a cell is also the first hit of a linear scan.
+        cells = [[] for _ in range(self.cols * self.rows)]
+        for index, (x1, y1, x2, y2) in enumerate(slot_rects):
+            c1, r1 = self._cell(x1, y1)
+            c2, r2 = self._cell(x2, y2)
+            for row in range(r1, r2 + 1):
+                for col in range(c1, c2 + 1):
+                    cells[row * self.cols + col].append(index)
+
+        # Padded (num_cells, K) table, -1 = empty. Index -1 hits the sentinel
+        # rect appended below, which can never contain a point.
+        width = max((len(c) for c in cells), default=0)
+        self.cell_slots = np.full((len(cells), max(width, 1)), -1, dtype=np.int64)
+        for cell_id, members in enumerate(cells):
+            self.cell_slots[cell_id, :len(members)] = members
+        sentinel = np.array([[np.inf, np.inf, -np.inf, -np.inf]], dtype=np.float32)
+        self._rects = np.concatenate([slot_rects, sentinel])
+
+    def _cell(self, x, y):
+        col = int((x - self.origin[0]) // self.cell_size)
+        row = int((y - self.origin[1]) // self.cell_size)
+        return col, row
+
+    def match(self, map_points):
+        """
+        For every map point, the FIRST slot (in config order) that contains it,
+        checking only the slots in the point's own grid cell.
+        Returns an (M,) int array of slot indices, -1 where no slot matched.
+        """
+        result = np.full(len(map_points), -1, dtype=np.int64)
+        if len(map_points) == 0 or len(self.slot_rects) == 0:
+            return result
+
+        cell_xy = np.floor((map_points - self.origin) / self.cell_size).astype(np.int64)
+        on_grid = ((cell_xy[:, 0] >= 0) & (cell_xy[:, 0] < self.cols) &
+                   (cell_xy[:, 1] >= 0) & (cell_xy[:, 1] < self.rows))
+        if not on_grid.any():
+            return result
+
+        points = map_points[on_grid]
+        cell_ids = cell_xy[on_grid, 1] * self.cols + cell_xy[on_grid, 0]
+        candidates = self.cell_slots[cell_ids]      # (m, K)
+        rects = self._rects[candidates]             # (m, K, 4)
+
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+        inside = ((rects[..., 0] <= x) & (x <= rects[..., 2]) &
+                  (rects[..., 1] <= y) & (y <= rects[..., 3]))
+        first_hit = inside.argmax(axis=1)
+        hit_slots = candidates[np.arange(len(candidates)), first_hit]
+        result[on_grid] = np.where(inside.any(axis=1), hit_slots, -1)
+        return result
+
+
+def status_from_matches(slot_indices, num_slots):
+    """Builds the '0'/'1' status string from the matched slot indices."""
+    slot_status = np.full(num_slots, ord('0'), dtype=np.uint8)
+    hits = slot_indices[slot_indices >= 0]
+    slot_status[hits] = ord('1')
+    return slot_status.tobytes().decode('ascii')
@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+import numpy as np
+
+from slot_matcher import SlotGrid, transform_points
+
+# Camera rows transformed per block while building (keeps memory flat at 4K)
+BUILD_BLOCK_ROWS = 256
+# Bump when build() changes what a cell holds, so old cached tables are NOT reused
+CACHE_VERSION = 2
+
+
+class SlotRaster:
+    """
+    Camera pixel -> slot index lookup table for one camera. For a fixed
+    homography and slot config the answer for a pixel never changes, so it is
+    worked out ONCE for every pixel (or every 1/scale pixels) and classifying
+    a detection becomes a single array index: no perspective transform, no
+    slot search. Cells hold the slot index, or -1 where no slot is.
+    """
+
+    def __init__(self, table, scale):
+        self.table = table
+        self.scale = scale
+        self.height, self.width = table.shape
+
+    @classmethod
+    def build(cls, h_matrix, slot_rects, frame_size, scale=1.0):
+        """Runs the normal transform + SlotGrid match once for every cell of the raster."""
+        frame_width, frame_height = frame_size
+        width = max(int(round(frame_width * scale)), 1)
+        height = max(int(round(frame_height * scale)), 1)
+        dtype = np.int16 if len(slot_rects) < np.iinfo(np.int16).max else np.int32
+        table = np.empty((height, width), dtype=dtype)
+
+        slot_grid = SlotGrid(slot_rects)
+        # Cell j covers camera x in [j / scale, (j + 1) / scale) (see lookup()),
+        # so it is classified by the point at the CENTRE of that span
+        xs = (np.arange(width, dtype=np.float32) + 0.5) / scale
+        for row in range(0, height, BUILD_BLOCK_ROWS):
+            rows = np.arange(row, min(row + BUILD_BLOCK_ROWS, height))
+            ys = (rows.astype(np.float32) + 0.5) / scale
+            grid_x, grid_y = np.meshgrid(xs, ys)
+            points = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+            table[rows[0]:rows[-1] + 1] = slot_grid.match(transform_points(points, h_matrix)).reshape(len(rows), width)
+        return cls(table, scale)
+
+    @classmethod
+    def load_or_build(cls, h_matrix, slot_rects, frame_size, scale=1.0, cache_dir=None):
+        """
+        Like build(), but cached in cache_dir under a hash of everything the
+        table depends on: a new calibration or config simply gets a new file.
+        """
+        if not cache_dir:
+            return cls.build(h_matrix, slot_rects, frame_size, scale)
+
+        key = hashlib.md5(f"v{CACHE_VERSION}".encode())
+        for part in (np.asarray(h_matrix, dtype=np.float64), np.asarray(slot_rects, dtype=np.float32),
+                     np.asarray(frame_size, dtype=np.int64), np.float64(scale)):
+            key.update(part.tobytes())
+        cache_file = os.path.join(cache_dir, f"slot_raster_{key.hexdigest()}.npy")
+
+        if os.path.exists(cache_file):
+            try:
+                return cls(np.load(cache_file), scale)
+            except Exception as e:
+                print(f"Slot raster cache {cache_file} unreadable, rebuilding: {e}")
+
+        raster = cls.build(h_matrix, slot_rects, frame_size, scale)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename, so a crash never leaves half a table behind
+        temp_file = cache_file + ".tmp.npy"
+        np.save(temp_file, raster.table)
+        os.replace(temp_file, cache_file)
+        return raster
+
+    def lookup(self, points):
+        """
+        Slot index for every (x, y) camera pixel in the (M, 2) array, -1 for none.
+        Returns an (M,) int64 array, plus a boolean mask of the points that
+        fell outside the raster (those need the slow path).
+        """
+        cells = np.floor(points * self.scale).astype(np.int64)
+        inside = ((cells[:, 0] >= 0) & (cells[:, 0] < self.width) &
+                  (cells[:, 1] >= 0) & (cells[:, 1] < self.height))
+        result = np.full(len(points), -1, dtype=np.int64)
+        result[inside] = self.table[cells[inside, 1], cells[inside, 0]]
+        return result, ~inside
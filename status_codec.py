@@ -0,0 +1,92 @@
+import base64
+
+import numpy as np
+
+# Status string characters: '0' = free, anything else = occupied.
+# '1' = occupied (type unknown), 'C' = car, 'S' = SUV, 'B' = bike.
+OCCUPIED_CODES = "1CSB"
+
+# 2-bit vehicle class codes for the compact encoding ('1' -> 0: occupied, class unknown)
+CLASS_CODES = {'C': 1, 'S': 2, 'B': 3}
+
+FORMATS = ("full", "bitset", "delta")
+
+
+def status_array(status_string):
+    """The status string as a uint8 array of its characters (no copy)."""
+    return np.frombuffer(status_string.encode('ascii'), dtype=np.uint8)
+
+
+def count_status(status_string):
+    """Free/occupied totals, plus how many slots hold each vehicle code."""
+    codes = status_array(status_string)
+    by_code = {code: int(np.count_nonzero(codes == ord(code))) for code in OCCUPIED_CODES}
+    occupied = sum(by_code.values())
+    return {
+        "total": len(codes),
+        "occupied": occupied,
+        "free": len(codes) - occupied,
+        "by_code": by_code,
+    }
+
+
+def encode_bitset(status_string):
+    """
+    Packs the status into two base64 blobs:
+    - occupied: 1 bit per slot (slot 0 = most significant bit of byte 0)
+    - classes: 2 bits per slot, 4 slots per byte (0 = unknown, 1 = C, 2 = S, 3 = B)
+    """
+    codes = status_array(status_string)
+    occupied = codes != ord('0')
+
+    classes = np.zeros(len(codes), dtype=np.uint8)
+    for code, value in CLASS_CODES.items():
+        classes[codes == ord(code)] = value
+    # Pad to a multiple of 4 slots, then pack 4 x 2 bits into each byte
+    classes = np.pad(classes, (0, -len(classes) % 4)).reshape(-1, 4)
+    packed_classes = (classes[:, 0] << 6) | (classes[:, 1] << 4) | (classes[:, 2] << 2) | classes[:, 3]
+
+    return {
+        "length": len(codes),
+        "occupied": base64.b64encode(np.packbits(occupied).tobytes()).decode('ascii'),
+        "classes": base64.b64encode(packed_classes.astype(np.uint8).tobytes()).decode('ascii'),
+    }
+
+
+def decode_bitset(length, occupied, classes):
+    """Inverse of encode_bitset(), back to the status string."""
+    occupied_bits = np.unpackbits(np.frombuffer(base64.b64decode(occupied), dtype=np.uint8))[:length]
+    packed = np.frombuffer(base64.b64decode(classes), dtype=np.uint8)
+    class_values = np.stack([(packed >> shift) & 3 for shift in (6, 4, 2, 0)], axis=1).reshape(-1)[:length]
+
+    lookup = np.array([ord(c) for c in "1CSB"], dtype=np.uint8)
+    codes = np.where(occupied_bits.astype(bool), lookup[class_values], ord('0')).astype(np.uint8)
+    return codes.tobytes().decode('ascii')
+
+
+def status_token(epoch, version):
+    """
+    '<epoch>-<version>': names a status version in ETags, ?since= and SSE ids.
+    The epoch is new on every backend start, so a token handed out before a
+    restart can't be mistaken for the version that now has the same number.
+    """
+    return f"{epoch}-{version}"
+
+
+def token_version(token, epoch):
+    """The version in a status_token() of this epoch; None for another epoch's (or a malformed) token."""
+    if token is None:
+        return None
+    token_epoch, _, version = str(token).rpartition("-")
+    # isascii(): isdigit() alone lets through digits int() can't parse, like '²'
+    if token_epoch != epoch or not (version.isascii() and version.isdigit()):
+        return None
+    return int(version)
+
+
+def diff_status(old_status, new_status):
+    """[[slot_index, new_code], ...] for every slot that differs between the two strings."""
+    old_codes = status_array(old_status)
+    new_codes = status_array(new_status)
+    changed = np.flatnonzero(old_codes != new_codes)
+    return [[int(index), chr(new_codes[index])] for index in changed]
@@ -0,0 +1,40 @@
+import asyncio
+
+
+class StatusNotifier:
+    """
+    Wakes up async waiters (SSE streams, long-polls) when a lot's status changes.
+    notify() is safe to call from any thread; waiting happens on the server's
+    event loop, so hundreds of open dashboards cost no threads.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._events = {}  # lot_id -> asyncio.Event for the NEXT change
+
+    def attach(self, loop):
+        """Call once from the running event loop (app startup)."""
+        self.loop = loop
+
+    def notify(self, lot_id):
+        """Called by whoever changed the lot (worker threads, API threads)."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake, lot_id)
+
+    def _wake(self, lot_id):
+        event = self._events.pop(lot_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, lot_id, timeout):
+        """
+        Waits for the next change of lot_id. Returns False on timeout.
+        Check the lot's version BEFORE calling this (with no await in between)
+        so a change can't slip through unnoticed.
+        """
+        event = self._events.setdefault(lot_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -0,0 +1,152 @@
+import json
+
+import cv2
+import numpy as np
+
+# Synthetic lots, cameras and traffic for benchmarks and load tests.
+# Everything is seeded, so the same arguments always give the same lot.
+
+SLOT_W, SLOT_H = 47, 69    # Same size as the slots of the real config.json
+SLOT_GAP = 6               # Between neighbouring slots
+AISLE = 80                 # Driving lane after every pair of slot rows
+VEHICLE_TYPES = ["car", "car", "car", "bike", "bus"]
+# Detection boxes: a vehicle covers this much of a slot on the ground (map
+# pixels), and its ground contact is the bottom GROUND_SHARE of its camera box
+VEHICLE_W, VEHICLE_L = 0.8 * SLOT_W, 0.8 * SLOT_H
+GROUND_SHARE = 0.3
+
+
+def make_lot_config(num_slots, lot_id=None, seed=0):
+    """
+    A config.json-style dict with num_slots slots laid out in double rows with
+    an aisle between each pair, roughly square overall.
+    """
+    rng = np.random.default_rng(seed)
+    per_row = max(int(np.ceil(np.sqrt(num_slots * SLOT_H / SLOT_W))), 1)
+    num_rows = -(-num_slots // per_row)
+
+    slots = []
+    for index in range(num_slots):
+        row, col = divmod(index, per_row)
+        x = SLOT_GAP + col * (SLOT_W + SLOT_GAP)
+        y = SLOT_GAP + row * (SLOT_H + SLOT_GAP) + (row // 2) * AISLE
+        slots.append({
+            "id": index,
+            "label": f"Slot_{index}",
+            "type": VEHICLE_TYPES[int(rng.integers(len(VEHICLE_TYPES)))],
+            "coordinates": {"x": x, "y": y, "w": SLOT_W, "h": SLOT_H}
+        })
+
+    lot_id = lot_id or f"synthetic_{num_slots}"
+    return {
+        "lot_id": lot_id,
+        "lot_name": f"Synthetic lot ({num_slots} slots)",
+        "map_image_url": None,
+        "image_dimensions": {
+            "width": SLOT_GAP + per_row * (SLOT_W + SLOT_GAP),
+            "height": SLOT_GAP + num_rows * (SLOT_H + SLOT_GAP) + (num_rows // 2) * AISLE
+        },
+        "slots": slots
+    }
+
+
+def make_homography(config, camera_size=(1920, 1080), seed=0, region=None):
+    """
+    A camera -> map matrix (like matrix.npy) for a camera looking down at the
+    whole lot (or at region = (x1, y1, x2, y2) of the map) at an angle: the far
+    edge is squeezed towards the top of the frame, with a little random skew.
+    """
+    rng = np.random.default_rng(seed)
+    cam_w, cam_h = camera_size
+    if region is None:
+        region = (0, 0, config['image_dimensions']['width'], config['image_dimensions']['height'])
+    x1, y1, x2, y2 = region
+
+    squeeze = rng.uniform(0.2, 0.35) * cam_w
+    camera_quad = np.float32([
+        [squeeze, 0.1 * cam_h], [cam_w - squeeze, 0.1 * cam_h],
+        [cam_w, cam_h], [0, cam_h]
+    ]) + np.float32(rng.uniform(-0.02, 0.02, size=(4, 2)) * [cam_w, cam_h])
+    map_quad = np.float32([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+    return cv2.getPerspectiveTransform(camera_quad, map_quad)
+
+
+def slot_centers(config):
+    """(N, 2) float32 map-pixel centres of the slots."""
+    coords = [slot['coordinates'] for slot in config['slots']]
+    return np.array([[c['x'] + c['w'] / 2, c['y'] + c['h'] / 2] for c in coords], dtype=np.float32)
+
+
+def to_detections(map_points, h_matrix, types, boxes=True):
+    """
+    Map points (vehicle centres) -> the edge JSON format, in camera pixels
+    (inverse of the camera's matrix). With boxes, each detection also gets a
+    box size like model/app.py sends: the vehicle's ground rectangle seen by
+    the camera is the bottom GROUND_SHARE of a box with centre x/y and w/h.
+    """
+    if len(map_points) == 0:
+        return []
+    to_camera = np.linalg.inv(h_matrix)
+    if not boxes:
+        camera_points = cv2.perspectiveTransform(
+            map_points.reshape(-1, 1, 2).astype(np.float32), to_camera).reshape(-1, 2)
+        return [{"x": round(float(x), 1), "y": round(float(y), 1), "type": t}
+                for (x, y), t in zip(camera_points, types)]
+
+    corners = np.float32([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * [VEHICLE_W / 2, VEHICLE_L / 2]
+    ground = (map_points[:, None, :] + corners).reshape(-1, 1, 2).astype(np.float32)
+    ground = cv2.perspectiveTransform(ground, to_camera).reshape(-1, 4, 2)
+    left, right = ground[..., 0].min(axis=1), ground[..., 0].max(axis=1)
+    top, bottom = ground[..., 1].min(axis=1), ground[..., 1].max(axis=1)
+    height = (bottom - top) / GROUND_SHARE
+    return [{"x": round(float(x), 1), "y": round(float(y), 1), "w": round(float(w), 1), "h": round(float(h), 1),
+             "type": t}
+            for x, y, w, h, t in zip((left + right) / 2, bottom - height / 2, right - left, height, types)]
+
+
+def detection_stream(config, h_matrix, num_cars, ticks, churn=0.02, moving_share=0.05,
+                     jitter=3.0, seed=0, boxes=True):
+    """
+    Yields `ticks` lists of detections (camera pixels, with box sizes unless
+    boxes=False: see to_detections) for num_cars cars.
+    Most cars are parked in a slot (jittered by `jitter` map pixels from frame
+    to frame, like a real detector), `moving_share` of them are driving around
+    anywhere on the map, and every tick `churn` of the parked cars leave and
+    the same number arrive in free slots.
+    """
+    rng = np.random.default_rng(seed)
+    centers = slot_centers(config)
+    num_slots = len(centers)
+    map_size = np.float32([config['image_dimensions']['width'], config['image_dimensions']['height']])
+
+    num_moving = int(round(num_cars * moving_share))
+    num_parked = min(num_cars - num_moving, num_slots)
+    num_moving = num_cars - num_parked
+    parked = rng.permutation(num_slots)[:num_parked]
+    moving = rng.uniform(0, 1, size=(num_moving, 2)).astype(np.float32) * map_size
+    heading = rng.normal(0, 5, size=(num_moving, 2)).astype(np.float32)
+    types = [VEHICLE_TYPES[i] for i in rng.integers(len(VEHICLE_TYPES), size=num_cars)]
+
+    for _ in range(ticks):
+        # Departures and arrivals
+        swaps = int(rng.binomial(num_parked, churn)) if num_parked and num_parked < num_slots else 0
+        if swaps:
+            free = np.setdiff1d(np.arange(num_slots), parked)
+            leaving = rng.choice(num_parked, size=min(swaps, len(free)), replace=False)
+            parked[leaving] = rng.choice(free, size=len(leaving), replace=False)
+
+        moving = np.mod(moving + heading, map_size)
+        points = np.concatenate([
+            centers[parked] + rng.normal(0, jitter, size=(num_parked, 2)).astype(np.float32),
+            moving
+        ])
+        yield to_detections(points, h_matrix, types, boxes)
+
+
+def write_lot(config_file, matrix_file, num_slots, seed=0):
+    """Saves a synthetic config.json + matrix.npy pair, e.g. to run backend_brain against."""
+    config = make_lot_config(num_slots, seed=seed)
+    with open(config_file, 'w') as f:
+        json.dump(config, f, indent=4)
+    np.save(matrix_file, make_homography(config, seed=seed))
+    return config
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules live flat in the repo root (run with: python -m pytest tests),
+# the edge side's in model/
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(1, os.path.join(REPO_DIR, "model"))
@@ -0,0 +1,69 @@
+import numpy as np
+
+from edge_pipeline import EdgePipeline, StubDetector
+
+DETECTIONS = [{"x": 10.0, "y": 20.0, "w": 30.0, "h": 40.0, "type": "car"}]
+
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in: num_frames tiny frames, then end of stream."""
+
+    def __init__(self, num_frames):
+        self.remaining = num_frames
+        self.frame = np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def read(self):
+        if self.remaining <= 0:
+            return False, None
+        self.remaining -= 1
+        return True, self.frame
+
+    def get(self, prop):
+        return 0  # No FPS: not paced
+
+    def set(self, prop, value):
+        pass
+
+
+def run(num_frames, delay=0.0, queue_size=2, batch_frames=1):
+    batches = []
+    pipeline = EdgePipeline(FakeCapture(num_frames), StubDetector(DETECTIONS, delay=delay), batches.append,
+                            queue_size=queue_size, batch_frames=batch_frames, loop_video=False, realtime=False)
+    pipeline.start()
+    for thread in pipeline.threads:
+        thread.join(30)
+    # The end of the stream stops every stage on its own
+    assert not pipeline.running
+    return pipeline, batches
+
+
+def test_slow_detector_drops_old_frames():
+    pipeline, batches = run(200, delay=0.01)
+    stats = pipeline.stats
+    seqs = [frame["seq"] for batch in batches for frame in batch]
+
+    assert stats["read"] == 200
+    assert stats["dropped"] > 150
+    # Every frame read was either dropped or inferred
+    assert stats["read"] == stats["dropped"] + stats["inferred"]
+    assert stats["published"] == len(seqs) == stats["inferred"] - stats["publish_dropped"]
+    assert seqs == sorted(set(seqs))
+    assert seqs[-1] == 200  # The newest frame always gets through
+    assert all(frame["detections"] == DETECTIONS for batch in batches for frame in batch)
+
+
+def test_batches_keep_every_frame_in_order():
+    pipeline, batches = run(50, queue_size=100, batch_frames=4)
+    seqs = [frame["seq"] for batch in batches for frame in batch]
+
+    assert pipeline.stats["dropped"] == pipeline.stats["publish_dropped"] == 0
+    assert seqs == list(range(1, 51))
+    assert all(1 <= len(batch) <= 4 for batch in batches)
+    assert max(len(batch) for batch in batches) == 4
+    assert all(frame["timestamp"] > 0 for batch in batches for frame in batch)
+
+
+def test_empty_stream_publishes_nothing():
+    pipeline, batches = run(0)
+    assert batches == []
+    assert pipeline.stats["read"] == pipeline.stats["published"] == 0
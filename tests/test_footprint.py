@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+
+from footprint import footprint_hits, footprint_quads, intersection_areas, project_quads
+from slot_matcher import SlotGrid, build_slot_rects
+from synthetic_lot import make_homography, make_lot_config
+
+
+def cv2_area(quad, rect):
+    """Reference: cv2's convex polygon intersection."""
+    x1, y1, x2, y2 = rect
+    rect_polygon = np.float32([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+    area, _ = cv2.intersectConvexConvex(np.float32(quad), rect_polygon)
+    return max(area, 0.0)
+
+
+def random_quads(rng, count, size=100.0):
+    """Convex quads: rectangles seen through random perspective warps."""
+    base = np.float32([[0, 0], [1, 0], [1, 1], [0, 1]])
+    quads = []
+    for _ in range(count):
+        warped = base + rng.uniform(-0.2, 0.2, size=(4, 2)).astype(np.float32)
+        h_matrix = cv2.getPerspectiveTransform(base, warped)
+        quad = cv2.perspectiveTransform(base.reshape(-1, 1, 2), h_matrix).reshape(4, 2)
+        quads.append(quad * rng.uniform(5, 60, size=2) + rng.uniform(0, size, size=2))
+    return np.array(quads, dtype=np.float64)
+
+
+def test_intersection_areas_match_cv2():
+    rng = np.random.default_rng(0)
+    quads = random_quads(rng, 2_000)
+    corner = rng.uniform(0, 100, size=(2_000, 2))
+    rects = np.concatenate([corner, corner + rng.uniform(1, 60, size=(2_000, 2))], axis=1)
+    # Some quads fully inside, some fully outside their rect
+    rects[:100] = [-10, -10, 500, 500]
+    rects[100:200] = [900, 900, 950, 950]
+
+    areas = intersection_areas(quads, rects)
+    expected = np.array([cv2_area(quad, rect) for quad, rect in zip(quads, rects)])
+    # cv2 works in float32
+    np.testing.assert_allclose(areas, expected, rtol=1e-4, atol=1e-3)
+
+
+def test_footprint_hits_match_brute_force():
+    config = make_lot_config(400, seed=2)
+    slot_rects = build_slot_rects(config)
+    h_matrix = make_homography(config, seed=2)
+    rng = np.random.default_rng(1)
+    # Boxes around random camera points, sized so their footprints span 1-3 slots
+    boxes = np.column_stack([rng.uniform(0, 1920, 500), rng.uniform(100, 1080, 500),
+                             rng.uniform(10, 150, 500), rng.uniform(10, 150, 500)]).astype(np.float32)
+    map_quads = project_quads(footprint_quads(boxes), h_matrix)
+
+    threshold = 0.3
+    hits, best = footprint_hits(map_quads, SlotGrid(slot_rects), threshold)
+
+    slot_area = (slot_rects[:, 2] - slot_rects[:, 0]) * (slot_rects[:, 3] - slot_rects[:, 1])
+    # Shares within float32 noise of the threshold may go either way
+    surely_hit, surely_missed = set(), set()
+    for index, quad in enumerate(map_quads):
+        shares = np.array([cv2_area(quad, rect) for rect in slot_rects]) / slot_area
+        surely_hit.update(np.flatnonzero(shares >= threshold + 1e-4).tolist())
+        surely_missed.update(np.flatnonzero(shares < threshold - 1e-4).tolist())
+        if shares.max() >= threshold + 1e-4:
+            assert best[index] == int(np.argmax(shares)), index
+        elif shares.max() < threshold - 1e-4:
+            assert best[index] == -1, index
+    surely_missed -= surely_hit  # Missed by one footprint, hit by another
+    assert surely_hit <= set(hits.tolist())
+    assert not surely_missed & set(hits.tolist())
+    assert len(surely_hit) > 20  # The test actually covers something
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import occupancy_log
+from occupancy_log import OccupancyLog, RECORD_DTYPE
+
+NUM_SLOTS = 12
+CODES = np.frombuffer(b"0000001CSB", dtype=np.uint8)
+
+
+def random_history(seed, updates=400):
+    """[(time, status_string), ...]: random slot flips at random (sometimes equal-spaced) times."""
+    rng = np.random.default_rng(seed)
+    status = np.full(NUM_SLOTS, ord('0'), dtype=np.uint8)
+    times = np.cumsum(rng.exponential(60.0, size=updates)).round(1) + 1_000_000
+    history = []
+    for t in times:
+        flips = rng.random(NUM_SLOTS) < 0.2
+        status = np.where(flips, rng.choice(CODES, size=NUM_SLOTS), status)
+        history.append((float(t), status.tobytes().decode('ascii')))
+    return history
+
+
+@pytest.fixture
+def log_with_history(tmp_path, monkeypatch):
+    # Tiny chunks: every query crosses many chunk boundaries
+    monkeypatch.setattr(occupancy_log, "CHUNK_RECORDS", 7)
+    history = random_history(seed=3)
+    log = OccupancyLog(str(tmp_path / "lot.log"))
+    previous = "0" * NUM_SLOTS
+    for t, status in history:
+        log.append(t, previous, status)
+        previous = status
+    yield log, history
+    log.close()
+
+
+def occupied_at(history, t):
+    """Brute force: occupied slots after every update at or before t."""
+    count = 0
+    for update_time, status in history:
+        if update_time > t:
+            break
+        count = NUM_SLOTS - status.count('0')
+    return count
+
+
+def reference_intervals(history, start, end):
+    """(t0, t1, occupied) pieces of [start, end) with a constant occupied count."""
+    cuts = [start] + [t for t, _ in history if start < t < end] + [end]
+    return [(t0, t1, occupied_at(history, t0)) for t0, t1 in zip(cuts[:-1], cuts[1:])]
+
+
+def reference_bucket(history, b0, b1):
+    pieces = reference_intervals(history, b0, b1)
+    average = sum((t1 - t0) * count for t0, t1, count in pieces) / (b1 - b0)
+    return average, max(count for _, _, count in pieces)
+
+
+def test_occupancy_matches_brute_force(log_with_history):
+    log, history = log_with_history
+    start, end, step = history[20][0] - 13.0, history[300][0] + 7.5, 600.0
+    buckets = log.occupancy(start, end, step)
+    for bucket in buckets:
+        b0 = bucket["start"]
+        average, peak = reference_bucket(history, b0, min(b0 + step, end))
+        assert bucket["average_occupied"] == pytest.approx(average, abs=1e-3)
+        assert bucket["max_occupied"] == peak
+
+
+def test_peak_hours_matches_brute_force(log_with_history):
+    log, history = log_with_history
+    start, end = history[0][0] - 500.0, history[-1][0] + 500.0
+    weighted, observed, peak = np.zeros(24), np.zeros(24), np.zeros(24, dtype=int)
+    hour_start = np.floor(start / 3600) * 3600
+    while hour_start < end:
+        b0, b1 = max(hour_start, start), min(hour_start + 3600, end)
+        hour = int(hour_start // 3600) % 24
+        average, top = reference_bucket(history, b0, b1)
+        weighted[hour] += average * (b1 - b0)
+        observed[hour] += b1 - b0
+        peak[hour] = max(peak[hour], top)
+        hour_start += 3600
+    for row in log.peak_hours(start, end, NUM_SLOTS):
+        hour = row["hour"]
+        expected = weighted[hour] / observed[hour] if observed[hour] else 0.0
+        assert row["average_occupied"] == pytest.approx(expected, abs=1e-3)
+        assert row["max_occupied"] == peak[hour]
+
+
+def test_dwell_times_match_brute_force(log_with_history):
+    log, history = log_with_history
+    start, end = history[50][0], history[350][0]
+    sessions = {}
+    arrived = {}
+    previous = "0" * NUM_SLOTS
+    for t, status in history:
+        if start <= t < end:
+            for slot in range(NUM_SLOTS):
+                was_free, now_free = previous[slot] == '0', status[slot] == '0'
+                if was_free and not now_free:
+                    arrived[slot] = t
+                elif now_free and not was_free and slot in arrived:
+                    sessions.setdefault(slot, []).append(t - arrived.pop(slot))
+        previous = status
+
+    result = {row["slot"]: row for row in log.dwell_times(start, end)}
+    assert sorted(result) == sorted(sessions)
+    for slot, stays in sessions.items():
+        assert result[slot]["sessions"] == len(stays)
+        assert result[slot]["total_seconds"] == pytest.approx(sum(stays), abs=1e-3)
+        assert result[slot]["max_seconds"] == pytest.approx(max(stays), abs=1e-3)
+
+
+def test_restart_closes_parked_slots(tmp_path):
+    path = str(tmp_path / "lot.log")
+    log = OccupancyLog(path)
+    log.append(100.0, "0000", "1C00")
+    log.close()
+
+    # Backend restarts with every slot free again
+    log = OccupancyLog(path)
+    log.open_session(200.0)
+    assert log.last_codes().tolist() == [ord('0')] * 2
+    assert log.occupancy(100.0, 300.0, 100.0)[1]["average_occupied"] == 0
+    assert [row["sessions"] for row in log.dwell_times(0, 300)] == [1, 1]
+    log.close()
+
+
+def test_torn_record_is_dropped_on_open(tmp_path):
+    path = str(tmp_path / "lot.log")
+    log = OccupancyLog(path)
+    log.append(100.0, "00", "10")
+    log.close()
+    # The backend died halfway through writing a record
+    with open(path, 'ab') as f:
+        f.write(b"\x01" * (RECORD_DTYPE.itemsize // 2))
+
+    log = OccupancyLog(path)
+    log.open_session(200.0)
+    log.append(300.0, "00", "01")
+    records = log.records()
+    assert records['time'].tolist() == [100.0, 200.0, 300.0]
+    assert records['slot'].tolist() == [0, 0, 1]
+    log.close()
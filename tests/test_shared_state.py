@@ -0,0 +1,78 @@
+import json
+import multiprocessing
+
+import pytest
+
+from shared_state import (SUMMARY_CAPACITY, SharedLot, StatusReader, StatusWriter, check_summary_fits,
+                          status_path)
+
+EPOCH = "0badf00d"
+
+
+def status_of(version, slots):
+    """Every slot holds the last digit of the version, so a torn read shows up as mixed digits."""
+    return str(version % 10) * slots
+
+
+def write_many(state_dir, slots, versions, started):
+    writer = StatusWriter(state_dir, "lot", slots, 8, EPOCH)
+    started.set()
+    for version in range(1, versions + 1):
+        writer.publish(version, status_of(version, slots), {"version": version}, {"version": version})
+    writer.close()
+
+
+def test_round_trip(tmp_path):
+    writer = StatusWriter(str(tmp_path), "lot", 5, 4, EPOCH)
+    writer.publish_config({"slots": [{}] * 5}, '"etag-1"')
+    for version, status in enumerate(["00000", "10000", "10C00"]):
+        writer.publish(version, status, {"occupied": status.count("0")}, {"all": version})
+
+    lot = SharedLot(str(tmp_path), "lot")
+    assert lot.latest() == (2, "10C00", {"occupied": 3}, {"all": 2})
+    assert lot.latest_availability() == (2, {"all": 2})
+    assert lot.epoch == EPOCH
+    assert lot.changes_since(0, "10C00") == [[0, "1"], [2, "C"]]
+    assert lot.config_etag == '"etag-1"'
+
+    # The ring only holds 4 versions: older ones need the full string
+    for version in range(3, 8):
+        writer.publish(version, "00000", {}, None)
+    assert lot.changes_since(2, "00000") is None
+
+    # A new slot count = a new file: readers reopen it
+    writer.resize(7)
+    writer.publish(8, "0000000", {}, None)
+    assert lot.latest()[1] == "0000000"
+    writer.close()
+
+
+def test_readers_never_see_half_a_write(tmp_path):
+    slots, versions = 200_000, 3_000
+    context = multiprocessing.get_context("fork")
+    started = context.Event()
+    writer = context.Process(target=write_many, args=(str(tmp_path), slots, versions, started))
+    writer.start()
+    assert started.wait(30)
+
+    reader = StatusReader(status_path(str(tmp_path), "lot"))
+    reads = 0
+    while writer.is_alive() or reads == 0:
+        version, codes, summary = reader.read()
+        summary = json.loads(summary) if summary else {"counts": {"version": 0}}
+        if version == 0:
+            continue
+        assert codes == status_of(version, slots).encode()
+        assert summary["counts"]["version"] == version
+        reads += 1
+    writer.join()
+    assert writer.exitcode == 0
+    assert reads > 10
+
+
+def test_summary_size_checked_up_front():
+    counts = {"total": 0, "free": 0}
+    check_summary_fits(100, counts, {"by_zone": {"a": {"free": 0}}})
+    zones = {f"zone_{index}": {"total": 0, "occupied": 0, "free": 0} for index in range(SUMMARY_CAPACITY // 40)}
+    with pytest.raises(ValueError):
+        check_summary_fits(1_000_000, counts, {"by_zone": zones})
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import slot_finder
+from slot_finder import ANY_TYPE, SlotFinder, nearest_free_slots
+
+
+def random_config(rng, num_slots):
+    slots = [{"id": index, "type": "ev" if index % 5 == 0 else "car",
+              "coordinates": {"x": float(x), "y": float(y), "w": 10.0, "h": 20.0}}
+             for index, (x, y) in enumerate(rng.uniform(0, 5000, size=(num_slots, 2)))]
+    return {"slots": slots}
+
+
+def random_status(rng, num_slots, free_share):
+    return "".join(np.where(rng.random(num_slots) < free_share, "0", "1").tolist())
+
+
+def brute_force(finder, point, k, slot_type, status_string):
+    free = np.array([code == "0" for code in status_string])
+    indices = finder.groups[slot_type][0]
+    indices = indices[free[indices]]
+    distances = np.hypot(*(finder.centers[indices] - point).T)
+    order = np.argsort(distances, kind='stable')[:k]
+    return indices[order], distances[order]
+
+
+def check_against_brute_force(finder, rng, free_shares):
+    for version, free_share in enumerate(free_shares):
+        status_string = random_status(rng, finder.num_slots, free_share)
+        groups = finder.free_groups(version, status_string)
+        for point in rng.uniform(-500, 5500, size=(20, 2)):
+            for slot_type in [ANY_TYPE, "car", "ev"]:
+                for k in [1, 5, 50]:
+                    got = finder.nearest(point, k, slot_type, groups)
+                    expected = brute_force(finder, point, k, slot_type, status_string)
+                    assert np.array_equal(got[0], expected[0])
+                    assert np.allclose(got[1], expected[1])
+
+
+# Full, nearly full, half, and nearly empty lots
+FREE_SHARES = [0.0, 0.001, 0.02, 0.5, 0.99]
+
+
+def test_tree_matches_brute_force(monkeypatch):
+    pytest.importorskip("scipy")
+    monkeypatch.setattr(slot_finder, "DIRECT_MAX_FREE", 0)  # ALWAYS go through the tree
+    finder = SlotFinder(random_config(np.random.default_rng(1), 20_000))
+    check_against_brute_force(finder, np.random.default_rng(2), FREE_SHARES)
+
+
+def test_direct_path_matches_brute_force(monkeypatch):
+    monkeypatch.setattr(slot_finder, "DIRECT_MAX_FREE", 10**9)
+    finder = SlotFinder(random_config(np.random.default_rng(3), 5_000))
+    check_against_brute_force(finder, np.random.default_rng(4), FREE_SHARES)
+
+
+def test_without_scipy(monkeypatch):
+    monkeypatch.setattr(slot_finder, "cKDTree", None)
+    finder = SlotFinder(random_config(np.random.default_rng(5), 5_000))
+    assert all(tree is None for _, tree in finder.groups.values())
+    check_against_brute_force(finder, np.random.default_rng(6), FREE_SHARES)
+
+
+class FakeLot:
+    def __init__(self, config, status_string, version=7):
+        self.config = config
+        self.slot_finder = SlotFinder(config)
+        self.status = (version, status_string, {}, {})
+
+    def latest(self):
+        return self.status
+
+
+def test_nearest_free_slots():
+    config = {"slots": [{"id": f"A{index}", "label": f"A-{index}", "type": "car",
+                         "coordinates": {"x": index * 100.0, "y": 0.0, "w": 10.0, "h": 10.0}}
+                        for index in range(6)]}
+    lot = FakeLot(config, "100101")
+    version, results = nearest_free_slots(lot, (0.0, 5.0), k=2)
+    assert version == 7
+    assert [result["id"] for result in results] == ["A1", "A2"]
+    assert results[0] == {"index": 1, "id": "A1", "label": "A-1", "type": "car", "x": 105.0, "y": 5.0,
+                          "distance": 105.0}
+    assert [result["id"] for result in nearest_free_slots(lot, (450.0, 0.0), k=10)[1]] == ["A4", "A2", "A1"]
+
+    lot.status = (8, "1010", {}, {})  # Mid-reload: the slot count doesn't match the finder
+    assert nearest_free_slots(lot, (0.0, 0.0)) == (8, [])
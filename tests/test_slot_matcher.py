@@ -0,0 +1,37 @@
+import numpy as np
+
+from slot_matcher import SlotGrid, build_slot_rects
+from synthetic_lot import make_lot_config
+
+
+def brute_force_match(map_points, slot_rects):
+    """Reference: test every point against every slot, first hit in config order."""
+    x = map_points[:, 0:1]
+    y = map_points[:, 1:2]
+    inside = ((slot_rects[:, 0] <= x) & (x <= slot_rects[:, 2]) &
+              (slot_rects[:, 1] <= y) & (y <= slot_rects[:, 3]))
+    return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+
+def test_grid_matches_brute_force():
+    config = make_lot_config(2_000, seed=1)
+    slot_rects = build_slot_rects(config)
+    size = [config['image_dimensions']['width'], config['image_dimensions']['height']]
+    rng = np.random.default_rng(0)
+    # Some points off the map too, and some exactly on slot edges
+    points = np.concatenate([rng.uniform(-0.1, 1.1, size=(5_000, 2)) * size,
+                             rng.uniform(0, 1, size=(5_000, 2)) * size,
+                             slot_rects[:500, :2], slot_rects[:500, 2:]]).astype(np.float32)
+    np.testing.assert_array_equal(SlotGrid(slot_rects).match(points), brute_force_match(points, slot_rects))
+
+
+def test_overlapping_slots_first_in_config_order():
+    slot_rects = np.float32([[0, 0, 10, 10], [5, 5, 20, 20], [0, 0, 100, 100]])
+    points = np.float32([[7, 7], [15, 15], [50, 50], [200, 200]])
+    np.testing.assert_array_equal(SlotGrid(slot_rects, cell_size=4).match(points), [0, 1, 2, -1])
+
+
+def test_empty():
+    grid = SlotGrid(np.zeros((0, 4), dtype=np.float32))
+    assert grid.match(np.float32([[1, 1]])).tolist() == [-1]
+    assert len(SlotGrid(np.float32([[0, 0, 1, 1]])).match(np.zeros((0, 2), dtype=np.float32))) == 0
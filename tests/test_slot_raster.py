@@ -0,0 +1,46 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from slot_matcher import SlotGrid, build_slot_rects, transform_points
+from slot_raster import SlotRaster
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRAME_SIZE = (854, 480)  # camera_view.png
+
+
+@pytest.fixture(scope="module")
+def calibration():
+    with open(os.path.join(REPO_DIR, "config.json")) as f:
+        slot_rects = build_slot_rects(json.load(f))
+    return np.load(os.path.join(REPO_DIR, "matrix.npy")), slot_rects
+
+
+# A cell holds ONE answer for all its pixels, so points near slot edges can
+# disagree with the exact path. Cell centres sampled half a pixel off would
+# push these to ~4.4% and ~5.7%.
+@pytest.mark.parametrize("scale, max_disagreement", [(1.0, 0.03), (0.5, 0.05)])
+def test_raster_agrees_with_transform_and_match(calibration, scale, max_disagreement):
+    h_matrix, slot_rects = calibration
+    points = (np.random.default_rng(0).uniform(0, 1, size=(100_000, 2)) * FRAME_SIZE).astype(np.float32)
+    exact = SlotGrid(slot_rects).match(transform_points(points, h_matrix))
+
+    raster = SlotRaster.build(h_matrix, slot_rects, FRAME_SIZE, scale)
+    looked_up, outside = raster.lookup(points)
+    assert not outside.any()
+    in_a_slot = (exact >= 0) | (looked_up >= 0)
+    assert in_a_slot.sum() > 10_000
+    assert np.mean(looked_up[in_a_slot] != exact[in_a_slot]) < max_disagreement
+
+
+def test_cell_centres_are_exact(calibration):
+    h_matrix, slot_rects = calibration
+    raster = SlotRaster.build(h_matrix, slot_rects, FRAME_SIZE, 0.5)
+    cells = np.stack(np.meshgrid(np.arange(raster.width), np.arange(raster.height)), axis=-1).reshape(-1, 2)
+    centres = ((cells + 0.5) / raster.scale).astype(np.float32)
+    looked_up, _ = raster.lookup(centres)
+    np.testing.assert_array_equal(looked_up, SlotGrid(slot_rects).match(transform_points(centres, h_matrix)))
+    # Off the frame: the caller takes the slow path
+    assert raster.lookup(np.float32([[-1, 5], [FRAME_SIZE[0] + 1, 5]]))[1].all()
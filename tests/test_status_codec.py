@@ -0,0 +1,51 @@
+import base64
+
+import numpy as np
+import pytest
+
+from status_codec import (count_status, decode_bitset, diff_status, encode_bitset, status_token,
+                          token_version)
+
+
+def random_status(rng, length):
+    return "".join(rng.choice(list("01CSB"), size=length).tolist())
+
+
+@pytest.mark.parametrize("length", [0, 1, 3, 4, 5, 7, 8, 9, 15, 17, 1001])
+def test_bitset_round_trip(length):
+    rng = np.random.default_rng(length)
+    for _ in range(20):
+        status_string = random_status(rng, length)
+        encoded = encode_bitset(status_string)
+        assert encoded["length"] == length
+        assert decode_bitset(**encoded) == status_string
+
+
+def test_bitset_layout():
+    # Slot 0 = most significant bit; classes 2 bits each, 4 slots per byte
+    encoded = encode_bitset("1C0SB")
+    assert base64.b64decode(encoded["occupied"]) == bytes([0b11011000])
+    assert base64.b64decode(encoded["classes"]) == bytes([0b00010010, 0b11000000])
+
+
+def test_diff_status_matches_brute_force():
+    rng = np.random.default_rng(0)
+    old_status, new_status = random_status(rng, 500), random_status(rng, 500)
+    expected = [[index, new] for index, (old, new) in enumerate(zip(old_status, new_status)) if old != new]
+    assert diff_status(old_status, new_status) == expected
+    assert diff_status(old_status, old_status) == []
+
+
+def test_count_status():
+    assert count_status("01CSB0C") == {"total": 7, "occupied": 5, "free": 2,
+                                       "by_code": {"1": 1, "C": 2, "S": 1, "B": 1}}
+
+
+def test_tokens():
+    epoch = "1a2b3c4d"
+    assert token_version(status_token(epoch, 0), epoch) == 0
+    assert token_version(status_token(epoch, 12345), epoch) == 12345
+    # Another boot's token, or not a token at all: the client gets the full status
+    for token in [None, "", "12", "-12", "deadbeef-12", f"{epoch}-", f"{epoch}--1", f"{epoch}-1.5",
+                  f"{epoch}-abc", f"{epoch}-²", f"x{epoch}-3", 12]:
+        assert token_version(token, epoch) is None